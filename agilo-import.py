@@ -11,14 +11,29 @@ from tiget.plugins import load_plugin
 from tiget.scrum.models import Sprint, User, Ticket, Comment
 
 
-def _bar(label, cur):
+# number of rows fetched from the server-side cursor at once
+ITERSIZE = 2000
+
+
+def _stream(conn, label, query, params=None):
+    cur = conn.cursor()
+    cur.execute('select count(*) from ({}) as rows'.format(query), params)
+    total = cur.fetchone()[0]
+    cur.close()
+
     widgets = [
-        'Importing {} {} '.format(cur.rowcount, label), Bar(), ' ',
+        'Importing {} {} '.format(total, label), Bar(), ' ',
         Percentage(), ' ', ETA()]
-    bar = ProgressBar(widgets=widgets, maxval=cur.rowcount).start()
-    for row in cur:
-        yield row
-        bar.update(cur.rownumber)
+    bar = ProgressBar(widgets=widgets, maxval=total).start()
+    cur = conn.cursor(label, cursor_factory=RealDictCursor)
+    cur.itersize = ITERSIZE
+    try:
+        cur.execute(query, params)
+        for rownumber, row in enumerate(cur, 1):
+            yield row
+            bar.update(rownumber)
+    finally:
+        cur.close()
     bar.finish()
 
 
@@ -39,8 +54,10 @@ def main():
         where raw.user is not null and trim(raw.user) != ''
         order by trim(raw.user)
     ''')
-    print('Importing {} users (please provide an email address):'.format(cur.rowcount))
-    user_pks = {}
+    print('Importing {} users (please provide an email address):'.format(
+        cur.rowcount))
+    users = {}
+    new_users = []
     for row in cur:
         name = row['name']
         default_email = '{}@example.org'.format(name)
@@ -49,30 +66,42 @@ def main():
         if not email:
             email = default_email
         try:
-            user = User.objects.get(email=email)
+            user = User.objects.get(pk=email)
         except User.DoesNotExist:
-            user = User.create(email=email, name=name)
-        user_pks[name] = user.pk
-
-    def _get_user(trac_name):
-        return User.objects.get(pk=user_pks[trac_name])
+            user = User(email=email, name=name)
+            new_users.append(user)
+        users[name] = user
+    cur.close()
+    User.objects.bulk_create(new_users)
 
-    cur.execute('''
+    rows = _stream(conn, 'sprints', '''
         select name,
                description,
                to_timestamp(start) as start,
                to_timestamp(sprint_end) as end
         from agilo_sprint
     ''')
-    for row in _bar('sprints', cur):
-        Sprint.create(**row)
+    Sprint.objects.bulk_create(Sprint(**row) for row in rows)
 
-    cur.execute('''
+    ticket_pks = {}
+
+    def _tickets(rows):
+        for row in rows:
+            ticket_id = row.pop('id')
+            for key in ('reporter', 'owner'):
+                row[key] = users[row[key]] if row[key] else None
+            ticket = Ticket(**row)
+            ticket_pks[ticket_id] = ticket.pk
+            yield ticket
+            # TODO: add comment with original ticket id
+
+    rows = _stream(conn, 'tickets', '''
         select id,
                summary,
                description,
                case type when 'task' then 'feature' else type end as type,
-               case when status in ('assigned', 'accepted', 'reopened') then 'new'
+               case when status in ('assigned', 'accepted', 'reopened')
+                        then 'new'
                     when status in ('info_needed', 'undecided') then 'wtf'
                     when status = 'closed' then
                         case resolution when 'invalid' then 'invalid'
@@ -89,36 +118,31 @@ def main():
         where type in ('idea', 'requirement', 'bug', 'feature', 'wording',
                        'story', 'task', 'training')
     ''')
-    ticket_pks = {}
-    for row in _bar('tickets', cur):
-        ticket_id = row.pop('id')
-        for key in ('reporter', 'owner'):
-            row[key] = _get_user(row[key]) if row[key] else None
-        ticket = Ticket.create(**row)
-        ticket_pks[ticket_id] = ticket.pk
-        # TODO: add comment with original ticket id
+    Ticket.objects.bulk_create(_tickets(rows))
 
     # TODO: import ticket changes
 
-    cur.execute('''
+    def _comments(rows):
+        for row in rows:
+            row['ticket'] = ticket_pks[row['ticket']]
+            row['author'] = users[row['author']]
+            yield Comment(**row)
+            # TODO: import timestamp?
+
+    rows = _stream(conn, 'comments', '''
         select ticket,
-               author,
+               trim(author) as author,
                newvalue as text
         from ticket_change
         where ticket in %s and
               field = 'comment' and
               newvalue is not null and trim(newvalue) != ''
     ''', (tuple(ticket_pks.keys()),))
-    for row in _bar('comments', cur):
-        ticket = row['ticket']
-        row['ticket'] = Ticket.objects.get(pk=ticket_pks[ticket])
-        row['author'] = _get_user(row['author'])
-        Comment.create(**row)
-        # TODO: import timestamp?
+    Comment.objects.bulk_create(_comments(rows))
 
-    cur.close()
     conn.close()
 
+
 if __name__ == '__main__':
     load_plugin('tiget.core')
     load_plugin('tiget.scrum')
@@ -36,6 +36,7 @@ setup(
         'console_scripts': [
             'tiget = tiget.main:main',
             'tiget-setup = tiget.setup:main',
+            'tiget-benchmark = tiget.benchmark:main',
         ],
         'nose.plugins.0.10': [
             'tiget_nose_config = tiget.nose_config:NoseConfig',
@@ -0,0 +1,290 @@
+import os
+import sys
+import json
+import time
+import random
+import shutil
+import platform
+import tempfile
+import subprocess
+from argparse import ArgumentParser
+from datetime import datetime, timedelta
+
+from tiget import __version__
+
+
+__all__ = ['BenchmarkError', 'generate', 'run_benchmarks', 'compare', 'main']
+
+DEFAULT_SIZES = (1000, 10000, 100000)
+DEFAULT_REPEAT = 5
+DEFAULT_THRESHOLD = 0.2
+
+CURRENT_USER = 'user0@example.org'
+
+WORDS = (
+    'crash', 'login', 'page', 'slow', 'error', 'report', 'export', 'button',
+    'sprint', 'broken', 'layout', 'search', 'timeout', 'upload', 'missing',
+    'typo', 'mail', 'settings', 'dashboard', 'permission', 'cache', 'api',
+)
+
+# argv of the benchmarked commands; {ticket} is replaced by the pk of a
+# ticket and {run} by the number of the run, so edits always change data
+CASES = (
+    ('startup', ['set']),
+    ('list', ['list', 'ticket']),
+    ('list-where', ['list', 'ticket', '-w', 'status=new owner=me']),
+    ('mine', ['mine']),
+    ('stats', ['stats']),
+    ('show', ['show', 'ticket', '{ticket}']),
+    ('edit', ['edit', 'ticket', '{ticket}', 'summary=benchmark {run}']),
+)
+
+
+class BenchmarkError(Exception): pass
+
+
+def _words(rand, count):
+    return ' '.join(rand.choice(WORDS) for _ in range(count))
+
+
+def generate(path, tickets, seed=0):
+    # Builds a repository with the given number of tickets (and as many
+    # comments) plus users and sprints in proportion. Returns the pk of a
+    # ticket owned by the current user.
+    from git_orm import transaction
+    from tiget.conf import settings
+    from tiget.git import init_repo
+    from tiget.plugins import load_plugin, plugins
+
+    subprocess.check_call(['git', 'init', '-q', path])
+    for key, value in (('user.name', 'tiget'), ('user.email', CURRENT_USER)):
+        subprocess.check_call(['git', 'config', key, value], cwd=path)
+    if not 'core' in plugins:
+        load_plugin('tiget.core')
+    settings.core.repository = path
+    init_repo()
+    if not 'scrum' in plugins:
+        load_plugin('tiget.scrum')
+    from tiget.scrum.models import User, Sprint, Ticket, Comment
+
+    rand = random.Random(seed)
+    with transaction.wrap() as trans:
+        tigetrc = 'load scrum\nset scrum.current_user={}\n'.format(
+            CURRENT_USER)
+        trans.set_blob(['config', 'tigetrc'], tigetrc.encode('utf-8'))
+        trans.add_message('Configure current user')
+
+        users = []
+        for i in range(max(5, tickets // 100)):
+            users.append(User(
+                email='user{}@example.org'.format(i),
+                name='User {}'.format(i)))
+        User.objects.bulk_create(users)
+
+        start = datetime(2013, 1, 7, 9)
+        sprints = []
+        for i in range(max(1, tickets // 500)):
+            sprints.append(Sprint(
+                name='sprint-{}'.format(i), description=_words(rand, 5),
+                start=start + timedelta(weeks=2 * i),
+                end=start + timedelta(weeks=2 * i + 2)))
+        Sprint.objects.bulk_create(sprints)
+
+        instances = []
+        for i in range(tickets):
+            instances.append(Ticket(
+                summary=_words(rand, 4),
+                description=_words(rand, 30) if rand.random() < 0.5 else None,
+                sprint=rand.choice(sprints + [None]),
+                reporter=rand.choice(users),
+                owner=users[0] if i == 0 else rand.choice(users + [None]),
+                status=rand.choice(Ticket.STATUS_CHOICES),
+                type=rand.choice(Ticket.TYPE_CHOICES)))
+        Ticket.objects.bulk_create(instances)
+
+        comments = (
+            Comment(
+                ticket=rand.choice(instances), author=rand.choice(users),
+                text=_words(rand, 15))
+            for _ in range(tickets))
+        Comment.objects.bulk_create(comments)
+    return instances[0].pk
+
+
+def _run_tiget(path, argv, env):
+    cmd = [
+        sys.executable, '-c', 'from tiget.main import main; main()',
+        '--no-daemon',
+    ] + argv
+    with open(os.devnull, 'r+b') as devnull:
+        p = subprocess.Popen(
+            cmd, cwd=path, env=env, stdin=devnull, stdout=devnull,
+            stderr=subprocess.PIPE)
+        start = time.time()
+        _, stderr = p.communicate()
+        elapsed = time.time() - start
+    if p.returncode:
+        raise BenchmarkError('{} failed:\n{}'.format(
+            ' '.join(argv), stderr.decode('utf-8', 'replace')))
+    return elapsed
+
+
+def _get_env(home):
+    import tiget
+    env = dict(os.environ)
+    # keep the user's ~/.tigetrc and an interactive editor or pager out
+    env.update(HOME=home, EDITOR='true', PAGER='cat')
+    # benchmark this tiget, even if it isn't installed
+    path = os.path.dirname(os.path.dirname(os.path.abspath(tiget.__file__)))
+    env['PYTHONPATH'] = os.pathsep.join(
+        filter(None, [path, env.get('PYTHONPATH')]))
+    return env
+
+
+def run_case(path, argv, ticket, repeat, env):
+    # every case runs once untimed, so derived data in the git dir (indexes,
+    # history) is built before the measurement starts
+    runs = []
+    for i in range(repeat + 1):
+        args = [arg.format(ticket=ticket, run=i) for arg in argv]
+        elapsed = _run_tiget(path, args, env)
+        if i:
+            runs.append(elapsed)
+    runs.sort()
+    return {
+        'min': runs[0],
+        'median': runs[len(runs) // 2],
+        'runs': runs,
+    }
+
+
+def run_benchmarks(sizes, repeat, keep=None, log=None):
+    results = {}
+    tmpdir = tempfile.mkdtemp(prefix='tiget-benchmark-')
+    try:
+        env = _get_env(tmpdir)
+        for size in sizes:
+            path = os.path.join(keep or tmpdir, 'size-{}'.format(size))
+            ticket_file = os.path.join(path, '.git', 'tiget-benchmark')
+            if os.path.exists(ticket_file):
+                with open(ticket_file) as f:
+                    ticket = f.read().strip()
+            else:
+                if log:
+                    log('generating {} tickets in {}'.format(size, path))
+                ticket = generate(path, size)
+                with open(ticket_file, 'w') as f:
+                    f.write(ticket)
+            results[str(size)] = timings = {}
+            for name, argv in CASES:
+                timings[name] = run_case(path, argv, ticket, repeat, env)
+                if log:
+                    log('{:>7} {:<12} {:8.1f} ms'.format(
+                        size, name, timings[name]['median'] * 1000))
+    finally:
+        shutil.rmtree(tmpdir, ignore_errors=True)
+    return {
+        'tiget': __version__,
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'date': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+        'repeat': repeat,
+        'results': results,
+    }
+
+
+def compare(baseline, current, threshold=DEFAULT_THRESHOLD):
+    # yields (size, case, baseline median, current median, regression) for
+    # every measurement in both results
+    for size, timings in sorted(
+            current['results'].items(), key=lambda x: int(x[0])):
+        baseline_timings = baseline['results'].get(size, {})
+        for name, _ in CASES:
+            if not name in timings or not name in baseline_timings:
+                continue
+            old = baseline_timings[name]['median']
+            new = timings[name]['median']
+            yield size, name, old, new, new > old * (1 + threshold)
+
+
+def _print_comparison(rows):
+    from tiget.table import Table
+    table = Table('size', 'case', 'baseline', 'current', 'change', '')
+    regressions = 0
+    for size, name, old, new, regression in rows:
+        regressions += regression
+        table.add_row(
+            size, name, '{:.1f} ms'.format(old * 1000),
+            '{:.1f} ms'.format(new * 1000),
+            '{:+.0f}%'.format((new / old - 1) * 100 if old else 0),
+            'REGRESSION' if regression else '')
+    sys.stdout.write(table.render())
+    return regressions
+
+
+def _load_results(filename):
+    with open(filename) as f:
+        return json.load(f)
+
+
+def main():
+    parser = ArgumentParser(description='benchmark tiget commands')
+    subparsers = parser.add_subparsers(dest='action')
+    run_parser = subparsers.add_parser(
+        'run', help='run the benchmarks on generated repositories')
+    run_parser.add_argument(
+        '-s', '--sizes', default=','.join(map(str, DEFAULT_SIZES)),
+        help='comma separated numbers of tickets (default: %(default)s)')
+    run_parser.add_argument(
+        '-r', '--repeat', type=int, default=DEFAULT_REPEAT,
+        help='timed runs per command (default: %(default)s)')
+    run_parser.add_argument(
+        '-o', '--output', help='write the results as json to this file')
+    run_parser.add_argument(
+        '-k', '--keep', metavar='DIR',
+        help='keep the generated repositories in DIR and reuse them')
+    run_parser.add_argument(
+        '-b', '--baseline', help='compare the results to this file')
+    run_parser.add_argument(
+        '-t', '--threshold', type=float, default=DEFAULT_THRESHOLD,
+        help='slowdown reported as regression (default: %(default)s)')
+    compare_parser = subparsers.add_parser(
+        'compare', help='compare stored results to a baseline')
+    compare_parser.add_argument('baseline')
+    compare_parser.add_argument('results')
+    compare_parser.add_argument(
+        '-t', '--threshold', type=float, default=DEFAULT_THRESHOLD,
+        help='slowdown reported as regression (default: %(default)s)')
+    args = parser.parse_args()
+
+    if args.action == 'compare':
+        rows = compare(
+            _load_results(args.baseline), _load_results(args.results),
+            args.threshold)
+        sys.exit(1 if _print_comparison(rows) else 0)
+    elif args.action == 'run':
+        try:
+            sizes = [int(size) for size in args.sizes.split(',')]
+        except ValueError:
+            parser.error('invalid sizes: {}'.format(args.sizes))
+
+        def log(message):
+            print(message, file=sys.stderr)
+        try:
+            results = run_benchmarks(sizes, args.repeat, args.keep, log)
+        except BenchmarkError as e:
+            print(e, file=sys.stderr)
+            sys.exit(1)
+        if args.output:
+            with open(args.output, 'w') as f:
+                json.dump(results, f, indent=2, sort_keys=True)
+        else:
+            json.dump(results, sys.stdout, indent=2, sort_keys=True)
+            print()
+        if args.baseline:
+            rows = compare(
+                _load_results(args.baseline), results, args.threshold)
+            sys.exit(1 if _print_comparison(rows) else 0)
+    else:
+        parser.print_usage()
+        sys.exit(1)
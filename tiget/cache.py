@@ -0,0 +1,150 @@
+import atexit
+import marshal
+from collections import OrderedDict
+
+from tiget.conf import settings
+from tiget.plugins import plugins
+from tiget.index import Index, get_cached_index, get_cached_indexes
+
+
+__all__ = [
+    'LRUCache', 'ObjectStore', 'get_object_cache', 'get_object_store',
+    'flush_object_stores',
+]
+
+DEFAULT_SIZE = 10000
+
+
+class LRUCache:
+    def __init__(self, size=DEFAULT_SIZE):
+        self.size = size
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self.entries)
+
+    def __contains__(self, key):
+        return key in self.entries
+
+    @property
+    def hit_rate(self):
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0
+
+    def get(self, key, default=None):
+        try:
+            value = self.entries[key]
+        except KeyError:
+            self.misses += 1
+            return default
+        self.entries.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def put(self, key, value):
+        if self.size <= 0:
+            return
+        self.entries[key] = value
+        self.entries.move_to_end(key)
+        self.resize(self.size)
+
+    def resize(self, size):
+        self.size = size
+        while self.entries and len(self.entries) > size:
+            self.entries.popitem(last=False)
+
+    def clear(self):
+        self.entries.clear()
+        self.hits = self.misses = 0
+
+
+# maps blob oids to the parsed field dicts of the objects. Blobs are
+# immutable, so entries never become stale and the cache is kept for the
+# whole process (e.g. a repl or daemon session). The dicts are shared and
+# must not be modified.
+_object_cache = LRUCache()
+
+
+def get_object_cache():
+    if 'core' in plugins:
+        size = settings.core.cache_size
+        if not size == _object_cache.size:
+            _object_cache.resize(size)
+    return _object_cache
+
+
+class ObjectStore(Index):
+    # The parsed objects of a model at the branch head, so that a new
+    # process does not have to read and parse the blobs again. Entries map
+    # the serialized pk to the blob oid and the parsed fields. The store is
+    # filled with the objects that are actually loaded; changed objects are
+    # dropped and parsed again on their next use. Stored with marshal, which
+    # loads a lot faster than json, and written only by flush().
+    dirname = 'objects'
+    extension = 'bin'
+    binary = True
+
+    def __init__(self, model):
+        super().__init__(model)
+        self.entries = {}
+        self.dirty = False
+
+    def get(self, commit, key, oid):
+        self.update(commit)
+        entry = self.entries.get(key)
+        if entry is None or not entry[0] == oid.hex:
+            return None
+        return entry[1]
+
+    def put(self, commit, key, oid, data):
+        if commit is None or not self.commit == commit:
+            return
+        self.entries[key] = (oid.hex, data)
+        self.dirty = True
+
+    def rebuild(self, commit):
+        self.entries = {}
+
+    def apply_change(self, pk, old_oid, new_oid):
+        self.entries.pop(pk, None)
+
+    def save(self):
+        self.dirty = True
+
+    def flush(self):
+        if self.dirty:
+            self.dirty = False
+            super().save()
+
+    def read(self, f):
+        return marshal.loads(f.read())
+
+    def write(self, data, f):
+        f.write(marshal.dumps(data))
+
+    def dumps(self):
+        return self.entries
+
+    def loads(self, data):
+        if not isinstance(data, dict):
+            raise ValueError('invalid object store')
+        entries = {}
+        for key, (oid, fields) in data.items():
+            if not isinstance(oid, str) or not isinstance(fields, dict):
+                raise ValueError('invalid entry')
+            entries[key] = (oid, fields)
+        self.entries = entries
+
+
+def get_object_store(model):
+    return get_cached_index(ObjectStore, model)
+
+
+def flush_object_stores():
+    for store in get_cached_indexes(ObjectStore):
+        store.flush()
+
+
+atexit.register(flush_object_stores)
@@ -0,0 +1,143 @@
+from contextlib import contextmanager
+
+from tiget.conf import settings
+from tiget.plugins import plugins
+from tiget.git import diff_trees
+
+
+__all__ = [
+    'ChangeSet', 'get_changes', 'get_branch_ref', 'get_remote_ref',
+    'get_refs', 'publish', 'top_level', 'track',
+]
+
+
+class ChangeSet:
+    # the objects that differ between two commits of a ref; paths are tuples
+    # of unquoted names, e.g. ('tickets', '<id>')
+    def __init__(self, ref, old_commit, new_commit, changes):
+        self.ref = ref
+        self.old_commit = old_commit
+        self.new_commit = new_commit
+        self.changes = changes
+
+    def __repr__(self):
+        return '<ChangeSet {} {}..{}: {} changes>'.format(
+            self.ref, self.old_commit, self.new_commit, len(self.changes))
+
+    def __len__(self):
+        return len(self.changes)
+
+    def _filter(self, fn):
+        return set(
+            path for path, (old_oid, new_oid) in self.changes.items()
+            if fn(old_oid, new_oid))
+
+    @property
+    def added(self):
+        return self._filter(lambda old_oid, new_oid: old_oid is None)
+
+    @property
+    def modified(self):
+        return self._filter(
+            lambda old_oid, new_oid: None not in (old_oid, new_oid))
+
+    @property
+    def deleted(self):
+        return self._filter(lambda old_oid, new_oid: new_oid is None)
+
+    def iter_objects(self, storage_name):
+        # yields (pk, old oid, new oid) for the objects stored below
+        # storage_name
+        for path in sorted(self.changes):
+            if len(path) == 2 and path[0] == storage_name:
+                old_oid, new_oid = self.changes[path]
+                yield path[1], old_oid, new_oid
+
+
+def get_changes(old_commit, new_commit, path=(), ref=None):
+    changes = {}
+    for subpath, old_oid, new_oid in diff_trees(old_commit, new_commit, path):
+        changes[subpath] = (old_oid, new_oid)
+    return ChangeSet(ref, old_commit, new_commit, changes)
+
+
+def get_branch_ref():
+    return 'refs/heads/{}'.format(settings.core.branch)
+
+
+def get_remote_ref(remote=None):
+    # the tracking branch of remote, by default of the first remote
+    if remote is None:
+        remote = settings.core.remote[0]
+    return 'refs/remotes/{}/{}'.format(remote, settings.core.branch)
+
+
+def get_refs():
+    # the refs whose movements are published: the tiget branch and its
+    # remote tracking branches
+    refs = [get_branch_ref()]
+    for remote in settings.core.remote:
+        refs.append(get_remote_ref(remote))
+    return refs
+
+
+def _get_heads():
+    repo = settings.core.repository
+    heads = {}
+    for ref in get_refs():
+        try:
+            heads[ref] = repo.lookup_reference(ref).target.hex
+        except KeyError:
+            heads[ref] = None
+    return heads
+
+
+def _get_subscribers():
+    subscribers = []
+    for plugin in plugins.values():
+        subscribers += plugin.change_subscribers
+    return subscribers
+
+
+def publish(changeset):
+    for subscriber in _get_subscribers():
+        subscriber(changeset)
+
+
+_depth = 0
+
+
+@contextmanager
+def track():
+    # publishes the changes of every ref that moved inside the block; nested
+    # blocks are folded into the outermost one
+    global _depth
+    if _depth or 'core' not in plugins or settings.core.repository is None:
+        _depth += 1
+        try:
+            yield
+        finally:
+            _depth -= 1
+        return
+    heads = _get_heads()
+    _depth += 1
+    try:
+        yield
+    finally:
+        _depth -= 1
+        for ref, new_commit in sorted(_get_heads().items()):
+            old_commit = heads.get(ref)
+            if not old_commit == new_commit and _get_subscribers():
+                publish(get_changes(old_commit, new_commit, ref=ref))
+
+
+@contextmanager
+def top_level():
+    # the changes of commands in the block are published when they finish,
+    # even if a command (e.g. serve) is running
+    global _depth
+    depth, _depth = _depth, 0
+    try:
+        yield
+    finally:
+        _depth = depth
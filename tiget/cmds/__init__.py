@@ -1,23 +1,21 @@
 import os
 import shlex
 
-from tiget.cmds.base import aliases, CmdError, Cmd
-from tiget.plugins import plugins
+from git_orm import transaction, GitError
+
+from tiget.conf import settings
+from tiget.cmds.base import aliases, CmdError, CmdExit, Cmd
+from tiget.plugins import plugins, cmds
+from tiget.profiling import get_profiler, profiling
+from tiget.iostats import track_io
+from tiget.utils import print_error
 
 
 def get_command(name):
-    for plugin in plugins.values():
-        try:
-            cmd = plugin.cmds[name]
-            break
-        except KeyError:
-            pass
-    else:
-        raise KeyError(name)
-    return cmd
+    return cmds[name]
 
 
-def cmd_execv(argv):
+def _resolve(argv):
     if argv[0] in aliases:
         argv = shlex.split(aliases[argv[0]]) + argv[1:]
     name = argv.pop(0)
@@ -25,7 +23,46 @@ def cmd_execv(argv):
         cmd = get_command(name)
     except KeyError:
         raise CmdError('{}: command not found'.format(name))
-    cmd.run(*argv)
+    return cmd, argv
+
+
+def cmd_needs_terminal(argv):
+    # invalid commands don't need a terminal; their error is reported when
+    # they are executed
+    if not argv:
+        return False
+    try:
+        cmd, argv = _resolve(list(argv))
+        args = cmd.parser.parse_args(argv)
+    except (CmdError, CmdExit):
+        return False
+    return cmd.needs_terminal(args)
+
+
+def cmd_execv(argv):
+    cmd, argv = _resolve(argv)
+    with track_io(' '.join([cmd.name] + argv)):
+        _run(cmd, argv)
+
+
+def _run(cmd, argv):
+    if get_profiler().active or not 'core' in plugins:
+        cmd.run(*argv)
+        return
+    core = settings.core
+    if not (core.profile or core.profile_file or core.profile_top):
+        cmd.run(*argv)
+        return
+    cprofile = bool(core.profile_file or core.profile_top)
+    try:
+        with profiling(cprofile) as profiler:
+            cmd.run(*argv)
+    finally:
+        profiler.report(' '.join([cmd.name] + list(argv)))
+        if core.profile_file:
+            profiler.dump(core.profile_file)
+        if core.profile_top:
+            profiler.print_top(core.profile_top)
 
 
 def cmd_exec(line):
@@ -51,7 +88,10 @@ def cmd_exec(line):
         cmd_execv(line)
 
 
-def cmd_execfile(f):
+def cmd_execfile(f, batch=False, checkpoint=None):
+    if batch:
+        _execfile_batch(f, checkpoint)
+        return
     for lineno, line in enumerate(f.readlines(), 1):
         line = line.strip()
         if line in ('quit', 'exit'):
@@ -60,3 +100,52 @@ def cmd_execfile(f):
             cmd_exec(line)
         except CmdError as e:
             raise CmdError('"{}", line {}: {}'.format(f.name, lineno, e))
+
+
+def _commit_batch(trans, name, first, last):
+    if trans.has_changes:
+        transaction.commit('Batch {} (lines {}-{})'.format(name, first, last))
+    else:
+        transaction.rollback()
+
+
+def _execfile_batch(f, checkpoint=None):
+    # All lines are executed in one transaction that is committed at the
+    # end and every checkpoint lines (if set). If a line fails, everything
+    # since the last checkpoint is rolled back.
+    if checkpoint is None:
+        checkpoint = settings.core.batch_checkpoint
+    try:
+        transaction.begin()
+    except GitError as e:
+        raise CmdError('"{}": {}'.format(f.name, e))
+    trans = transaction.current()
+    first = lineno = 1
+    try:
+        for lineno, line in enumerate(f.readlines(), 1):
+            line = line.strip()
+            if line in ('quit', 'exit'):
+                break
+            cmd_exec(line)
+            try:
+                running = transaction.current() is trans
+            except GitError:
+                running = False
+            if not running:
+                raise CmdError('transactions can\'t be ended in batch mode')
+            if checkpoint and not lineno % checkpoint:
+                _commit_batch(trans, f.name, first, lineno)
+                transaction.begin()
+                trans = transaction.current()
+                first = lineno + 1
+        _commit_batch(trans, f.name, first, lineno)
+    except Exception as e:
+        try:
+            transaction.rollback()
+        except GitError:
+            pass
+        message = '"{}", line {}: {}'.format(f.name, lineno, e)
+        if isinstance(e, (CmdError, GitError)):
+            raise CmdError(message)
+        print_error('{} (rolled back)'.format(message))
+        raise
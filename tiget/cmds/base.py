@@ -1,7 +1,9 @@
 import re
 from argparse import ArgumentParser
 
-from tiget.utils import paginate
+from tiget.utils import Pager, PagerClosed
+from tiget.changes import track
+from tiget.profiling import get_profiler
 
 
 aliases = {
@@ -50,34 +52,58 @@ class Cmd(metaclass=CmdBase):
 
     def __init__(self, name):
         self.name = name
-        self.parser = CmdArgumentParser(self)
-        self.output = ''
-        self.setup()
+        self.output = None
+        self._parser = None
+
+    @property
+    def parser(self):
+        # the parser is built on first use, so registering a command is cheap
+        if self._parser is None:
+            self._parser = CmdArgumentParser(self)
+            self.setup()
+        return self._parser
 
     def setup(self):
         pass
 
+    def needs_terminal(self, args):
+        # commands that read stdin or start an editor are not executed by
+        # the daemon, but in the process of the client
+        return False
+
     def format_help(self):
         return self.parser.format_help()
 
     def run(self, *argv):
+        previous, self.output = self.output, Pager()
         try:
-            args = self.parser.parse_args(argv)
-            self.do(args)
-        except CmdExit:
-            return
-        self.flush()
+            with get_profiler().phase('parse arguments'):
+                args = self.parser.parse_args(argv)
+            with track():
+                self.do(args)
+            self.flush()
+        except (CmdExit, PagerClosed):
+            pass
+        finally:
+            self.output.abort()
+            self.output = previous
 
     def error(self, message):
         return CmdError('{}: {}'.format(self.name, message))
 
+    def write(self, s):
+        if self.output is None:
+            self.output = Pager()
+        with get_profiler().phase('output'):
+            self.output.write(s)
+
     def print(self, *args, sep=' ', end='\n'):
-        self.output += sep.join(args) + end
+        self.write(sep.join(args) + end)
 
     def flush(self):
         if self.output:
-            paginate(self.output)
-        self.output = ''
+            with get_profiler().phase('output'):
+                self.output.close()
 
     def do(self, args):
         raise NotImplementedError
@@ -8,11 +8,12 @@ from tiget.plugins.settings import *
 
 class RepositorySetting(Setting):
     def clean(self, value):
+        from tiget.iostats import count_repository_io
         try:
             git_orm.set_repository(value)
         except git_orm.GitError as e:
             raise ValueError(e)
-        return git_orm.get_repository()
+        return count_repository_io()
 
     def format(self, repo):
         repo = git_orm.get_repository()
@@ -30,19 +31,31 @@ class BranchSetting(Setting):
 
 
 class RemoteSetting(Setting):
+    # comma separated list of remotes, the first one is the default remote
     def clean(self, value):
-        git_orm.set_remote(value)
-        return git_orm.get_remote()
+        if isinstance(value, str):
+            value = value.split(',')
+        elif not isinstance(value, (list, tuple)):
+            raise ValueError('value must be a comma separated list')
+        remotes = [remote.strip() for remote in value if remote.strip()]
+        if not remotes:
+            raise ValueError('at least one remote is required')
+        git_orm.set_remote(remotes[0])
+        return remotes
 
-    def format(self, repo):
-        return super().format(git_orm.get_remote())
+    def format(self, remotes):
+        return super().format(','.join(remotes))
 
 
 def load(plugin):
     from tiget.core import cmds
+    from tiget.index import on_change
     plugin.add_cmds(cmds)
+    plugin.add_change_subscriber(on_change)
     plugin.add_settings(
+        batch_checkpoint=IntSetting(default=0),
         branch=BranchSetting(),
+        cache_size=IntSetting(default=10000),
         remote=RemoteSetting(),
         debug=BoolSetting(default=False),
         color=BoolSetting(default=sys.stdout.isatty()),
@@ -51,7 +64,12 @@ def load(plugin):
         history_limit=IntSetting(default=1000),
         pager=StrSetting(default=os.environ.get('PAGER', 'less')),
         pdb_module=StrSetting(default='pdb'),
+        perf_summary=BoolSetting(default=False),
+        profile=BoolSetting(default=False),
+        profile_file=StrSetting(),
+        profile_top=IntSetting(default=0),
         repository=RepositorySetting(),
+        sync_timeout=IntSetting(default=60),
     )
     plugin.settings.branch = 'tiget'
     plugin.settings.remote = 'origin'
@@ -2,3 +2,4 @@ from tiget.core.cmds.shell import *
 from tiget.core.cmds.plugin import *
 from tiget.core.cmds.git import *
 from tiget.core.cmds.model import *
+from tiget.core.cmds.daemon import *
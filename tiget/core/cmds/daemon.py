@@ -0,0 +1,32 @@
+import socket
+
+from tiget.cmds import Cmd
+from tiget.daemon import DaemonError, Server, get_socket_path
+
+
+__all__ = ['Serve']
+
+
+class Serve(Cmd):
+    description = 'execute commands of other tiget processes in this one'
+
+    def setup(self):
+        self.parser.epilog = '''
+            Commands that read stdin or start an editor are executed by the
+            client itself. Settings, aliases and plugins are shared by all
+            clients: changing them (e.g. with set) affects all following
+            commands until the daemon is restarted.
+        '''
+
+    def do(self, args):
+        path = get_socket_path()
+        try:
+            server = Server(path)
+        except (DaemonError, socket.error) as e:
+            raise self.error(e)
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
@@ -1,9 +1,12 @@
 from functools import wraps
 
 from git_orm import transaction, GitError
-from git_orm.sync import fetch, push, merge
 
 from tiget.cmds import Cmd
+from tiget.conf import settings
+from tiget.table import Table
+from tiget.sync import fetch, push, sync_remotes
+from tiget.merge import RESOLUTIONS, MergeError, merge
 
 
 __all__ = ['Begin', 'Commit', 'Rollback', 'Fetch', 'Push', 'Merge']
@@ -46,25 +49,92 @@ class Rollback(Cmd):
         transaction.rollback()
 
 
-class Fetch(Cmd):
-    description = 'fetch changes from remote repository'
+class SyncCmd(Cmd):
+    abstract = True
+    sync = None
 
-    @catch_git_error
-    def do(self, args):
-        fetch()
-
-
-class Push(Cmd):
-    description = 'push changes to remote repository'
+    def setup(self):
+        self.parser.add_argument(
+            '-a', '--all', action='store_true',
+            help='all configured remotes (see "set remote")')
+        self.parser.add_argument(
+            '-t', '--timeout', type=int,
+            help='seconds to wait for each remote, 0 waits forever '
+            '(default: sync_timeout)')
+        self.parser.add_argument(
+            'remotes', nargs='*', help='remotes (default: the first one)')
 
-    @catch_git_error
     def do(self, args):
-        push()
+        remotes = args.remotes
+        if args.all:
+            remotes = settings.core.remote + remotes
+        elif not remotes:
+            remotes = settings.core.remote[:1]
+        remotes = sorted(set(remotes), key=remotes.index)
+        timeout = args.timeout
+        if timeout is None:
+            timeout = settings.core.sync_timeout
+        # the transfers run concurrently, so the total time is the time of
+        # the slowest remote
+        results = sync_remotes(self.sync, remotes, timeout or None)
+        failed = [result for result in results if not result.error is None]
+        if len(results) == 1:
+            if failed:
+                raise self.error('{}: {}'.format(
+                    failed[0].remote, failed[0].error))
+            return
+        table = Table('remote', 'result', 'time')
+        for result in results:
+            table.add_row(
+                result.remote, result.error or 'ok',
+                '{:.1f}s'.format(result.duration))
+        for line in table.render_lines():
+            self.write(line)
+        if failed:
+            # the results must be shown although the command fails
+            self.flush()
+            raise self.error('{} of {} remotes failed'.format(
+                len(failed), len(results)))
+
+
+class Fetch(SyncCmd):
+    description = 'fetch changes from remote repositories'
+    sync = staticmethod(fetch)
+
+
+class Push(SyncCmd):
+    description = 'push changes to remote repositories'
+    sync = staticmethod(push)
 
 
 class Merge(Cmd):
     description = 'merge remote and local changes'
 
-    @catch_git_error
+    def setup(self):
+        self.parser.add_argument(
+            '-r', '--resolve', choices=RESOLUTIONS,
+            help='resolve conflicts using this side')
+        self.parser.add_argument(
+            'ref', nargs='?',
+            help='remote or ref to merge (default: the first remote)')
+
     def do(self, args):
-        merge()
+        try:
+            status, conflicts = merge(args.ref, args.resolve)
+        except MergeError as e:
+            raise self.error(e)
+        if conflicts:
+            table = Table('path', 'field', 'base', 'ours', 'theirs')
+            for conflict in conflicts:
+                table.add_row(
+                    '/'.join(conflict.path), conflict.field or '(object)',
+                    conflict.base, conflict.ours, conflict.theirs)
+            for line in table.render_lines():
+                self.write(line)
+        if status == 'conflict':
+            # the conflicts must be shown although the command fails
+            self.flush()
+            raise self.error(
+                '{} conflicts, nothing merged; use --resolve'.format(
+                    len(conflicts)))
+        self.print(status)
@@ -1,3 +1,8 @@
+import csv
+import shlex
+from datetime import datetime
+from argparse import REMAINDER
+
 from git_orm import transaction
 
 from tiget.cmds import Cmd
@@ -5,9 +10,19 @@ from tiget.cmds.types import model_type, dict_type
 from tiget.utils import open_in_editor
 from tiget.table import Table
 from tiget.plugins import plugins
+from tiget.conf import settings
+from tiget.git import get_head
+from tiget.history import get_history_map
+from tiget.snapshot import snapshot
+from tiget.queryset import count_objects, get_referrers
+from tiget.filters import FilterError, compile_filters
+from tiget.dump import FORMATS, open_stream, dump_rows, load_rows
 
 
-__all__ = ['Create', 'Edit', 'List', 'Stats']
+__all__ = [
+    'Create', 'Edit', 'BatchEdit', 'Show', 'History', 'List', 'Stats',
+    'Export', 'Import',
+]
 
 
 class Create(Cmd):
@@ -17,6 +32,9 @@ class Create(Cmd):
         self.parser.add_argument('model', type=model_type)
         self.parser.add_argument('fields', nargs='*', type=dict_type)
 
+    def needs_terminal(self, args):
+        return True
+
     @transaction.wrap()
     def do(self, args):
         try:
@@ -37,11 +55,15 @@ class Edit(Cmd):
         self.parser.add_argument('pk')
         self.parser.add_argument('fields', nargs='*', type=dict_type)
 
+    def needs_terminal(self, args):
+        return not args.fields
+
     @transaction.wrap()
     def do(self, args):
         try:
             instance = args.model.objects.get(pk__startswith=args.pk)
-        except (args.model.DoesNotExist, args.model.MultipleObjectsReturned) as e:
+        except (args.model.DoesNotExist,
+                args.model.MultipleObjectsReturned) as e:
             raise self.error(e)
         try:
             data = dict(args.fields) or open_in_editor(instance.dumps())
@@ -51,6 +73,125 @@ class Edit(Cmd):
             raise self.error(e)
 
 
+class BatchEdit(Cmd):
+    description = 'apply the same change to all matching model instances'
+
+    def setup(self):
+        self.parser.add_argument(
+            '-n', '--dry-run', action='store_true',
+            help='only count the matching instances')
+        # the model is part of the remainder; otherwise argparse would
+        # swallow a "--" following it
+        self.parser.add_argument(
+            'args', nargs=REMAINDER,
+            metavar='model [filter...] -- field=value')
+
+    def parse_args(self, argv):
+        try:
+            i = argv.index('--')
+        except ValueError:
+            raise self.error('separate filters and changes with "--"')
+        if not argv[:i]:
+            raise self.error('no model given')
+        if not argv[i + 1:]:
+            raise self.error('no changes given')
+        try:
+            model = model_type(argv[0])
+        except TypeError:
+            raise self.error('invalid model: {}'.format(argv[0]))
+        try:
+            query = compile_filters(model, argv[1:i])
+        except FilterError as e:
+            raise self.error(e)
+        try:
+            changes = dict(dict_type(arg) for arg in argv[i + 1:])
+        except TypeError as e:
+            raise self.error(e)
+        return model, query, changes
+
+    def apply(self, instances, changes):
+        for instance in instances:
+            before = instance.dumps(include_hidden=True)
+            instance.loads(changes)
+            if not instance.dumps(include_hidden=True) == before:
+                yield instance
+
+    def do(self, args):
+        model, query, changes = self.parse_args(args.args)
+        objs = model.objects.filter(query)
+        try:
+            # counted with the indexes, before anything is loaded
+            matched = objs.count()
+            if args.dry_run:
+                self.print('{} objects would be edited'.format(matched))
+                return
+            self.print('editing {} matching objects'.format(matched))
+            with transaction.wrap():
+                count = model.objects.bulk_update(
+                    self.apply(objs.iterator(), changes))
+        except model.InvalidObject as e:
+            raise self.error(e)
+        self.print('edited {} objects, {} were unchanged'.format(
+            count, matched - count))
+
+
+class Show(Cmd):
+    description = 'show model instance with the objects referring to it'
+
+    def setup(self):
+        self.parser.add_argument('model', type=model_type)
+        self.parser.add_argument('pk')
+
+    @snapshot()
+    def do(self, args):
+        try:
+            instance = args.model.objects.get(pk__startswith=args.pk)
+        except (args.model.DoesNotExist,
+                args.model.MultipleObjectsReturned) as e:
+            raise self.error(e)
+        self.write(instance.dumps(include_hidden=True))
+        models = []
+        for plugin in plugins.values():
+            models += plugin.models.values()
+        for model, field, objs in get_referrers(instance, models):
+            if not objs.exists():
+                continue
+            self.print()
+            self.print('{} ({}):'.format(model._meta.storage_name, field.name))
+            fields = [
+                f.name for f in model._meta.writable_fields if not f is field]
+            table = Table.from_queryset(objs.order_by('pk'), fields=fields)
+            for line in table.render_lines():
+                self.write(line)
+
+
+class History(Cmd):
+    description = 'show the commits that changed a model instance'
+
+    def setup(self):
+        self.parser.add_argument('model', type=model_type)
+        self.parser.add_argument('pk')
+
+    @snapshot()
+    def do(self, args):
+        try:
+            instance = args.model.objects.get(pk__startswith=args.pk)
+        except (args.model.DoesNotExist,
+                args.model.MultipleObjectsReturned) as e:
+            raise self.error(e)
+        repo = settings.core.repository
+        table = Table('commit', 'date', 'author', 'change', 'message')
+        for entry in get_history_map().lookup(get_head(), instance.path):
+            commit = repo[entry.commit]
+            date = datetime.fromtimestamp(commit.commit_time)
+            message = commit.message.strip().split('\n', 1)[0]
+            table.add_row(
+                entry.commit[:7], date.strftime('%Y-%m-%d %H:%M'),
+                commit.author.name, entry.change, message)
+        for line in table.render_lines():
+            self.write(line)
+
+
 class List(Cmd):
     description = 'list records'
 
@@ -58,28 +199,100 @@ class List(Cmd):
         self.parser.add_argument('-f', '--fields')
         self.parser.add_argument('-o', '--order', default='pk')
         self.parser.add_argument('-s', '--slice', type=self.parse_slice)
+        self.parser.add_argument(
+            '-w', '--where', action='append', default=[],
+            help='filter expressions, e.g. "status=new,wtf owner=me"')
+        self.parser.add_argument(
+            '--explain', action='store_true',
+            help='show how the query was executed')
         self.parser.add_argument('model', type=model_type)
 
     def parse_slice(self, value):
         parts = [int(part) if part else None for part in value.split(':')]
         return slice(*parts)
 
-    @transaction.wrap()
+    @snapshot()
     def do(self, args):
-        objs = args.model.objects.order_by(*args.order.split(','))
+        objs = args.model.objects
+        if args.where:
+            try:
+                expressions = sum(map(shlex.split, args.where), [])
+                objs = objs.filter(compile_filters(args.model, expressions))
+            except (ValueError, FilterError) as e:
+                raise self.error(e)
+        objs = objs.order_by(*args.order.split(','))
         if args.slice:
             objs = objs[args.slice]
         fields = args.fields.split(',') if args.fields else None
         table = Table.from_queryset(objs, fields=fields)
-        self.print(table.render())
+        for line in table.render_lines():
+            self.write(line)
+        if args.explain:
+            plan = getattr(objs, 'plan', None)
+            self.print(str(plan) if plan else 'query was not executed')
 
 
 class Stats(Cmd):
     description = 'display statistics for models'
 
+    @snapshot()
     def do(self, args):
         table = Table('model', 'plugin', 'count')
         for plugin in plugins.values():
             for name, model in plugin.models.items():
-                table.add_row(name, plugin.name, model.objects.count())
-        self.print(table.render())
+                table.add_row(name, plugin.name, count_objects(model))
+        for line in table.render_lines():
+            self.write(line)
+
+
+class Export(Cmd):
+    description = 'export model instances as json lines or csv'
+
+    def setup(self):
+        self.parser.add_argument(
+            '-f', '--format', choices=sorted(FORMATS.keys()), default='jsonl')
+        self.parser.add_argument(
+            '-o', '--output', default='-',
+            help='file to write to (default: stdout)')
+        self.parser.add_argument('model', type=model_type)
+
+    @snapshot()
+    def do(self, args):
+        fields = [f.name for f in args.model._meta.writable_fields]
+        write = FORMATS[args.format].write
+        if args.output == '-':
+            # through the pager, which stops quietly on a closed pipe
+            write(self, fields, dump_rows(args.model))
+            return
+        try:
+            with open_stream(args.output, 'w') as f:
+                write(f, fields, dump_rows(args.model))
+        except IOError as e:
+            raise self.error(e)
+
+
+class Import(Cmd):
+    description = 'import model instances from json lines or csv'
+
+    def setup(self):
+        self.parser.add_argument(
+            '-f', '--format', choices=sorted(FORMATS.keys()), default='jsonl')
+        self.parser.add_argument(
+            '-i', '--input', default='-',
+            help='file to read from (default: stdin)')
+        self.parser.add_argument('model', type=model_type)
+
+    def needs_terminal(self, args):
+        return args.input == '-'
+
+    def do(self, args):
+        read = FORMATS[args.format].read
+        try:
+            with transaction.wrap(), open_stream(args.input, 'r') as f:
+                instances = load_rows(args.model, read(f))
+                count = args.model.objects.bulk_import(instances)
+        except (IOError, ValueError, csv.Error) as e:
+            raise self.error(e)
+        except args.model.InvalidObject as e:
+            raise self.error(e)
+        self.print('imported {} objects'.format(count))
@@ -1,7 +1,6 @@
-import pkg_resources
-
 from tiget.cmds import Cmd
 from tiget.plugins import load_plugin, unload_plugin, reload_plugin, plugins
+from tiget.plugins.manifest import iter_entry_points
 
 
 __all__ = ['Load', 'Reload', 'Unload']
@@ -21,7 +20,7 @@ class Load(Cmd):
                 raise self.error(e)
         else:
             self.print('Available plugins:')
-            entry_points = pkg_resources.iter_entry_points('tiget.plugins')
+            entry_points = iter_entry_points('tiget.plugins')
             names = set(ep.name for ep in entry_points)
             names.update(plugins.keys())
             for name in sorted(names):
@@ -1,15 +1,25 @@
+from argparse import REMAINDER
 from subprocess import list2cmdline
 
 from git_orm import transaction, GitError
 
 from tiget.conf import settings
 from tiget.plugins import plugins
-from tiget.cmds import get_command, aliases, Cmd, cmd_execfile
+from tiget.cmds import (
+    get_command, aliases, Cmd, cmd_execfile, cmd_execv, cmd_needs_terminal)
 from tiget.cmds.types import dict_type
 from tiget.utils import open_in_editor, load_file
+from tiget.table import Table
+from tiget.profiling import profiling
+from tiget.iostats import (
+    IOStats, get_last_stats, get_session_stats, reset_session_stats)
+from tiget.cache import get_object_cache
 
 
-__all__ = ['Alias', 'Unalias', 'Echo', 'EditConfig', 'Help', 'Set', 'Source']
+__all__ = [
+    'Alias', 'Unalias', 'Echo', 'EditConfig', 'Help', 'Perf', 'Set', 'Source',
+    'Time',
+]
 
 
 class Alias(Cmd):
@@ -57,6 +67,9 @@ class EditConfig(Cmd):
         self.parser.add_argument('-c', '--create', action='store_true')
         self.parser.add_argument('filename', nargs='?', default='tigetrc')
 
+    def needs_terminal(self, args):
+        return True
+
     @transaction.wrap()
     def do(self, args):
         path = args.filename.lstrip('/').split('/')
@@ -106,6 +119,43 @@ class Help(Cmd):
                 self.print()
 
 
+class Perf(Cmd):
+    description = 'show git object i/o of the last command and the session'
+
+    def setup(self):
+        self.parser.add_argument(
+            '-n', '--limit', type=int, default=10,
+            help='number of most read object paths to show')
+        self.parser.add_argument(
+            '--reset', action='store_true', help='reset the session totals')
+
+    def do(self, args):
+        if args.reset:
+            reset_session_stats()
+            return
+        last = get_last_stats() or IOStats()
+        session = get_session_stats()
+        self.print('last command: {}'.format(last.name or '-'))
+        self.print('session: {} commands'.format(session.commands))
+        cache = get_object_cache()
+        self.print('object cache: {} of {} entries, {:.0%} hit rate'.format(
+            len(cache), cache.size, cache.hit_rate))
+        table = Table('', 'last command', 'session')
+        for field in IOStats.FIELDS:
+            table.add_row(
+                field.replace('_', ' '), getattr(last, field),
+                getattr(session, field))
+        for line in table.render_lines():
+            self.write(line)
+        if args.limit and session.paths:
+            self.print()
+            table = Table('path', 'reads')
+            for path, count in session.paths.most_common(args.limit):
+                table.add_row(path, count)
+            for line in table.render_lines():
+                self.write(line)
+
+
 class Set(Cmd):
     description = 'set configuration variables'
 
@@ -140,11 +190,48 @@ class Source(Cmd):
     description = 'source configuration file'
 
     def setup(self):
+        self.parser.add_argument(
+            '-b', '--batch', action='store_true',
+            help='run all commands in one transaction')
+        self.parser.add_argument(
+            '-c', '--checkpoint', type=int, metavar='N',
+            help='in batch mode, commit every N lines')
         self.parser.add_argument('filename')
 
     def do(self, args):
+        if not args.checkpoint is None and not args.batch:
+            raise self.error('--checkpoint requires --batch')
         try:
             f = load_file(args.filename)
         except IOError as e:
             raise self.error(e)
-        cmd_execfile(f)
+        cmd_execfile(f, batch=args.batch, checkpoint=args.checkpoint)
+
+
+class Time(Cmd):
+    description = 'execute a command and report where the time went'
+
+    def setup(self):
+        self.parser.add_argument(
+            '-p', '--profile', metavar='FILE',
+            help='dump cProfile statistics to FILE')
+        self.parser.add_argument(
+            '-t', '--top', type=int, default=0, metavar='N',
+            help='print the N functions with the most own time')
+        self.parser.add_argument('argv', nargs=REMAINDER, metavar='cmd')
+
+    def needs_terminal(self, args):
+        return cmd_needs_terminal(args.argv)
+
+    def do(self, args):
+        if not args.argv:
+            raise self.error('no command given')
+        try:
+            with profiling(bool(args.profile or args.top)) as profiler:
+                cmd_execv(list(args.argv))
+        finally:
+            profiler.report(' '.join(args.argv))
+            if args.profile:
+                profiler.dump(args.profile)
+            if args.top:
+                profiler.print_top(args.top)
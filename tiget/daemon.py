@@ -0,0 +1,223 @@
+import os
+import sys
+import json
+import errno
+import socket
+import traceback
+from io import StringIO
+from threading import Lock
+from socketserver import (
+    ThreadingMixIn, UnixStreamServer, StreamRequestHandler)
+
+
+__all__ = [
+    'DaemonError', 'DetachedStdin', 'get_socket_path', 'find_socket_path',
+    'Server', 'forward',
+]
+
+SOCKET_NAME = 'daemon.sock'
+
+
+class DaemonError(Exception): pass
+
+
+def get_socket_path():
+    from tiget.git import get_cache_dir
+    return os.path.join(get_cache_dir(), SOCKET_NAME)
+
+
+def find_socket_path(path='.'):
+    # the client must not load any plugins, so the repository is discovered
+    # directly instead of through the core settings
+    from pygit2 import discover_repository
+    try:
+        gitdir = discover_repository(path)
+    except KeyError:
+        return None
+    return os.path.join(gitdir, 'tiget', SOCKET_NAME)
+
+
+def _send(f, **message):
+    f.write((json.dumps(message) + '\n').encode('utf-8'))
+    f.flush()
+
+
+class StreamWriter:
+    # file-like object that forwards writes to the client
+    def __init__(self, f, name):
+        self.f = f
+        self.name = name
+
+    def write(self, s):
+        try:
+            _send(self.f, **{self.name: s})
+        except (IOError, socket.error):
+            raise IOError(errno.EPIPE, 'client went away')
+        return len(s)
+
+    def flush(self):
+        pass
+
+    def isatty(self):
+        return False
+
+
+class DetachedStdin:
+    # commands that need the stdin of the client are run by the client (see
+    # Cmd.needs_terminal); everything else must not read it
+    def _fail(self, *args):
+        raise IOError('stdin is not available in the daemon; use --no-daemon')
+
+    read = readline = readlines = __iter__ = _fail
+
+    def isatty(self):
+        return False
+
+
+class RequestHandler(StreamRequestHandler):
+    def handle(self):
+        try:
+            request = json.loads(self.rfile.readline().decode('utf-8'))
+            argv = request['argv']
+            cwd = request['cwd']
+        except (ValueError, KeyError, TypeError):
+            return
+        with self.server.lock:
+            status = self.server.execute(argv, cwd, self.wfile)
+        try:
+            if status is None:
+                _send(self.wfile, local=True)
+            else:
+                _send(self.wfile, exit=status)
+        except (IOError, socket.error):
+            pass
+
+
+class Server(ThreadingMixIn, UnixStreamServer):
+    # Clients are accepted concurrently, but commands are executed one at a
+    # time: plugins, settings, transactions and sys.stdout are global state.
+    # This state is shared by all clients, e.g. a variable changed with set
+    # stays changed for the following commands.
+    daemon_threads = True
+
+    def __init__(self, path):
+        self.path = path
+        self.lock = Lock()
+        if os.path.exists(path):
+            if self._is_running():
+                raise DaemonError('daemon is already running')
+            os.unlink(path)
+        super().__init__(path, RequestHandler)
+
+    def _is_running(self):
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            sock.connect(self.path)
+        except socket.error:
+            return False
+        finally:
+            sock.close()
+        return True
+
+    def server_close(self):
+        super().server_close()
+        try:
+            os.unlink(self.path)
+        except OSError:
+            pass
+
+    def _rollback(self):
+        from git_orm import transaction, GitError
+        try:
+            transaction.rollback()
+        except GitError:
+            return False
+        return True
+
+    def needs_terminal(self, argv):
+        from tiget.cmds import cmd_needs_terminal
+        # argument errors are reported when the command is executed
+        streams = sys.stdout, sys.stderr
+        sys.stdout = sys.stderr = StringIO()
+        try:
+            return cmd_needs_terminal(argv)
+        finally:
+            sys.stdout, sys.stderr = streams
+
+    def execute(self, argv, cwd, f):
+        # returns the exit status or None if the client has to execute the
+        # command itself
+        from tiget.cmds import CmdError, cmd_execv
+        from tiget.cache import flush_object_stores
+        from tiget import changes, iostats
+        from tiget.utils import print_error
+
+        if self.needs_terminal(argv):
+            return None
+        streams = sys.stdin, sys.stdout, sys.stderr
+        sys.stdin = DetachedStdin()
+        sys.stdout = StreamWriter(f, 'stdout')
+        sys.stderr = StreamWriter(f, 'stderr')
+        previous_cwd = os.getcwd()
+        status = 0
+        try:
+            os.chdir(cwd)
+            # serve is the running command; every request is a command of
+            # its own for the i/o counters and the change feed
+            with iostats.top_level(), changes.top_level():
+                cmd_execv(argv)
+            # a transaction must never leak into the next request
+            if self._rollback():
+                raise CmdError('transaction rolled back; use --no-daemon')
+        except Exception as e:
+            status = 1
+            try:
+                if isinstance(e, CmdError):
+                    print_error(e)
+                else:
+                    print_error('internal error (see traceback)')
+                    traceback.print_exc()
+            except IOError:
+                pass    # the client went away
+        finally:
+            self._rollback()
+            flush_object_stores()
+            os.chdir(previous_cwd)
+            sys.stdin, sys.stdout, sys.stderr = streams
+        return status
+
+
+def forward(path, argv):
+    # returns the exit status of the command or None if no daemon is running
+    # or the command has to be executed locally
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        sock.connect(path)
+    except socket.error:
+        sock.close()
+        return None
+    status = 1
+    with sock, sock.makefile('rwb') as f:
+        _send(f, argv=argv, cwd=os.getcwd())
+        try:
+            for line in f:
+                message = json.loads(line.decode('utf-8'))
+                if 'stdout' in message:
+                    sys.stdout.write(message['stdout'])
+                elif 'stderr' in message:
+                    sys.stderr.write(message['stderr'])
+                elif 'exit' in message:
+                    status = message['exit']
+                    break
+                elif 'local' in message:
+                    return None
+            sys.stdout.flush()
+        except IOError as e:
+            if not e.errno == errno.EPIPE:
+                raise
+            # closing the connection stops the command in the daemon
+            devnull = os.open(os.devnull, os.O_WRONLY)
+            os.dup2(devnull, sys.stdout.fileno())
+            os.close(devnull)
+            status = 0
+    return status
@@ -0,0 +1,95 @@
+import sys
+import csv
+import json
+from collections import OrderedDict, namedtuple
+from contextlib import contextmanager
+
+from git_orm import serializer, transaction
+from git_orm.quote import quote_filename, unquote_filename
+
+from tiget.git import iter_blobs
+from tiget.iostats import get_stats
+
+
+__all__ = [
+    'FORMATS', 'open_stream', 'iter_serialized', 'dump_rows', 'load_rows',
+]
+
+
+def _write_jsonl(f, fields, rows):
+    count = 0
+    for row in rows:
+        f.write(json.dumps(row) + '\n')
+        count += 1
+    return count
+
+
+def _read_jsonl(f):
+    for line in f:
+        if line.strip():
+            yield json.loads(line)
+
+
+def _write_csv(f, fields, rows):
+    writer = csv.DictWriter(f, fields)
+    writer.writeheader()
+    count = 0
+    for row in rows:
+        writer.writerow({k: '' if v is None else v for k, v in row.items()})
+        count += 1
+    return count
+
+
+def _read_csv(f):
+    for row in csv.DictReader(f):
+        yield {k: v or None for k, v in row.items()}
+
+
+Format = namedtuple('Format', ['read', 'write'])
+
+FORMATS = {
+    'jsonl': Format(_read_jsonl, _write_jsonl),
+    'csv': Format(_read_csv, _write_csv),
+}
+
+
+@contextmanager
+def open_stream(filename, mode='r'):
+    if filename == '-':
+        yield sys.stdin if mode == 'r' else sys.stdout
+    else:
+        with open(filename, mode, newline='', encoding='utf-8') as f:
+            yield f
+
+
+def iter_serialized(model):
+    # yields the serialized objects of the running transaction one by one
+    trans = transaction.current()
+    storage_name = model._meta.storage_name
+    memory_tree = trans.get_memory_tree([quote_filename(storage_name)])
+    pending = dict(memory_tree.blobs)
+    if trans.parents:
+        for name, content in iter_blobs(trans.parents[0], [storage_name]):
+            yield name, pending.pop(quote_filename(name), content)
+    for name, content in pending.items():
+        yield unquote_filename(name), content
+
+
+def dump_rows(model):
+    pk_name = model._meta.pk.name
+    fields = [f.name for f in model._meta.writable_fields]
+    for pk, content in iter_serialized(model):
+        get_stats().read_path([model._meta.storage_name, pk], len(content))
+        data = serializer.loads(content.decode('utf-8'))
+        data[pk_name] = pk
+        yield OrderedDict((name, data.get(name)) for name in fields)
+
+
+def load_rows(model, rows):
+    for rownumber, row in enumerate(rows, 1):
+        instance = model()
+        try:
+            instance.loads(row)
+        except model.InvalidObject as e:
+            raise model.InvalidObject('row {}: {}'.format(rownumber, e))
+        yield instance
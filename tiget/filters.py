@@ -0,0 +1,96 @@
+import re
+from functools import reduce
+
+from git_orm.models import ForeignKey
+from git_orm.models.query import Query, Q
+
+
+__all__ = ['FilterError', 'Contains', 'parse_filter', 'compile_filters']
+
+EXPRESSION_RE = re.compile(r'^(\w+)(!=|~=|=)(.*)$')
+
+NULL = 'null'
+CURRENT = ('me', 'current')
+
+
+class FilterError(Exception): pass
+
+
+class Contains(Query):
+    # case insensitive substring match that never matches None; unlike
+    # Q(field__icontains=...) it is safe to use on nullable fields
+    def __init__(self, field, text):
+        self.field = field
+        self.text = text.lower()
+
+    def __repr__(self):
+        return 'Contains({!r}, {!r})'.format(self.field, self.text)
+
+    def __eq__(self, other):
+        return (
+            isinstance(other, self.__class__) and
+            self.field == other.field and self.text == other.text)
+
+    def __hash__(self):
+        return hash((self.field, self.text))
+
+    def execute(self, obj_cache, pks):
+        for pk in pks:
+            value = getattr(obj_cache[pk], self.field)
+            if not value is None and self.text in str(value).lower():
+                yield pk
+
+
+def _load_value(field, value):
+    if value == NULL:
+        if not field.null:
+            raise FilterError('{} can\'t be null'.format(field.name))
+        return None
+    if isinstance(field, ForeignKey) and value in CURRENT:
+        current = getattr(field.target, 'current', None)
+        if current is None:
+            raise FilterError('there is no current {}'.format(
+                field.target.__name__.lower()))
+        try:
+            obj = current()
+        except field.target.DoesNotExist as e:
+            raise FilterError(e)
+        return None if obj is None else obj.pk
+    try:
+        value = field.loads(value)
+    except ValueError as e:
+        raise FilterError(e)
+    if not field.choices is None and not value in field.choices:
+        raise FilterError('{} must be in {}'.format(field.name, field.choices))
+    return value
+
+
+# Supported expressions are "field=value", "field=a,b" (any of the values),
+# "field!=value", "field=null", "field!=null" and "field~=text" (case
+# insensitive substring match).
+def parse_filter(model, expression):
+    match = EXPRESSION_RE.match(expression)
+    if not match:
+        raise FilterError('invalid filter "{}"'.format(expression))
+    name, op, value = match.groups()
+    try:
+        field = model._meta.get_field(name)
+    except KeyError as e:
+        raise FilterError(e)
+    attname = field.attname
+
+    if op == '~=':
+        return Contains(attname, value)
+
+    # null is compared like any other value, so the field index is used
+    values = tuple(_load_value(field, v) for v in value.split(','))
+    if len(values) == 1:
+        query = Q(**{attname: values[0]})
+    else:
+        query = Q(**{attname + '__in': values})
+    return ~query if op == '!=' else query
+
+
+def compile_filters(model, expressions):
+    queries = [parse_filter(model, e) for e in expressions]
+    return reduce(lambda x, y: x & y, queries, Q())
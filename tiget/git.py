@@ -1,4 +1,5 @@
-import pkg_resources
+import os
+import stat
 
 from tiget.conf import settings
 
@@ -13,6 +14,116 @@ def get_config(name):
     return repo.config[name]
 
 
+def get_cache_dir(*path):
+    repo = settings.core.repository
+    if repo is None:
+        raise GitError('no repository found')
+    dirname = os.path.join(repo.path, 'tiget', *path)
+    os.makedirs(dirname, exist_ok=True)
+    return dirname
+
+
+def get_tree(commit, path):
+    from git_orm.quote import quote_filename
+    repo = settings.core.repository
+    tree = repo[commit].tree
+    for name in path:
+        name = quote_filename(name)
+        if not name in tree:
+            return None
+        entry = tree[name]
+        if not entry.filemode & stat.S_IFDIR:
+            return None
+        tree = repo[entry.oid]
+    return tree
+
+
+def iter_blobs(commit, path):
+    from git_orm.quote import unquote_filename
+    repo = settings.core.repository
+    tree = get_tree(commit, path)
+    if tree is None:
+        return
+    for entry in tree:
+        if entry.filemode & stat.S_IFREG:
+            yield unquote_filename(entry.name), repo[entry.oid].data
+
+
+def get_blob_oid(trans, path):
+    # oid of the blob at path in the tree of the transaction or None if the
+    # blob does not exist or was changed in the transaction
+    from git_orm.quote import quote_filename
+    *path, filename = map(quote_filename, path)
+    memory_tree = trans.get_memory_tree(path)
+    if filename in memory_tree.blobs or not filename in memory_tree.tree:
+        return None
+    entry = memory_tree.tree[filename]
+    if not entry.filemode & stat.S_IFREG:
+        return None
+    return entry.oid
+
+
+def get_blob_data(oid):
+    return settings.core.repository[oid].data
+
+
+def get_head():
+    # hex of the commit the tiget branch points to or None
+    repo = settings.core.repository
+    ref = 'refs/heads/{}'.format(settings.core.branch)
+    try:
+        return repo.lookup_reference(ref).target.hex
+    except KeyError:
+        return None
+
+
+def _get_entries(tree):
+    if tree is None:
+        return {}
+    return {entry.name: entry for entry in tree}
+
+
+def _diff_trees(old_tree, new_tree, path):
+    from git_orm.quote import unquote_filename
+    repo = settings.core.repository
+    if not old_tree is None and not new_tree is None:
+        if old_tree.oid == new_tree.oid:
+            return
+    old_entries = _get_entries(old_tree)
+    new_entries = _get_entries(new_tree)
+    for name in sorted(set(old_entries).union(new_entries)):
+        old_entry = old_entries.get(name)
+        new_entry = new_entries.get(name)
+        if not old_entry is None and not new_entry is None:
+            if old_entry.oid == new_entry.oid:
+                continue
+        subpath = path + (unquote_filename(name),)
+        blobs = []
+        trees = [None, None]
+        for i, entry in enumerate((old_entry, new_entry)):
+            if entry is None:
+                blobs.append(None)
+            elif entry.filemode & stat.S_IFDIR:
+                blobs.append(None)
+                trees[i] = repo[entry.oid]
+            else:
+                blobs.append(entry.oid)
+        if any(blobs):
+            yield (subpath,) + tuple(blobs)
+        if any(not tree is None for tree in trees):
+            for change in _diff_trees(trees[0], trees[1], subpath):
+                yield change
+
+
+def diff_trees(old_commit, new_commit, path=()):
+    # yields (path, old oid, new oid) for every blob below path that differs
+    # between both commits; the oid is None on the side the blob is missing
+    # and subtrees that didn't change are skipped
+    old_tree = None if old_commit is None else get_tree(old_commit, path)
+    new_tree = None if new_commit is None else get_tree(new_commit, path)
+    return _diff_trees(old_tree, new_tree, tuple(path))
+
+
 def is_repo_initialized():
     repo = settings.core.repository
     if repo is None:
@@ -26,6 +137,7 @@ def is_repo_initialized():
 
 
 def init_repo():
+    import pkg_resources
     from git_orm import transaction
 
     if is_repo_initialized():
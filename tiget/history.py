@@ -0,0 +1,168 @@
+import os
+import json
+from zlib import crc32
+from collections import namedtuple
+
+from tiget.conf import settings
+from tiget.git import get_cache_dir, diff_trees
+
+
+__all__ = ['HistoryEntry', 'HistoryMap', 'get_history_map']
+
+HistoryEntry = namedtuple('HistoryEntry', ['commit', 'change'])
+
+
+def _get_change(old_oid, new_oid):
+    if old_oid is None:
+        return 'added'
+    elif new_oid is None:
+        return 'deleted'
+    return 'modified'
+
+
+class HistoryMap:
+    # Append-only map from object paths to the commits that touched them,
+    # stored in buckets by path hash. The commits of the branch are
+    # processed oldest first, so the commit recorded in the meta file and
+    # all of its ancestors are known to be in the map.
+    VERSION = 1
+    BUCKETS = 256
+    # commits processed before the progress is saved
+    CHECKPOINT = 1000
+
+    def __init__(self):
+        self.commit = None
+
+    @property
+    def path(self):
+        return get_cache_dir('history')
+
+    @property
+    def filename(self):
+        return os.path.join(self.path, 'meta.json')
+
+    def get_bucket_filename(self, path):
+        number = crc32(json.dumps(path).encode('utf-8')) % self.BUCKETS
+        return os.path.join(self.path, '{:02x}.jsonl'.format(number))
+
+    def load(self):
+        self.commit = None
+        try:
+            with open(self.filename) as f:
+                data = json.load(f)
+            if not data['version'] == self.VERSION:
+                return
+            self.commit = data['commit']
+        except (IOError, ValueError, KeyError, TypeError):
+            return
+
+    def save(self):
+        data = {'version': self.VERSION, 'commit': self.commit}
+        with open(self.filename + '.tmp', 'w') as f:
+            json.dump(data, f)
+        os.rename(self.filename + '.tmp', self.filename)
+
+    def clear(self):
+        for name in os.listdir(self.path):
+            os.unlink(os.path.join(self.path, name))
+        self.commit = None
+
+    def append(self, entries):
+        buckets = {}
+        for path, commit, change in entries:
+            line = json.dumps([path, commit, change]) + '\n'
+            buckets.setdefault(self.get_bucket_filename(path), []).append(line)
+        for filename, lines in buckets.items():
+            with open(filename, 'a') as f:
+                f.writelines(lines)
+
+    def _is_ancestor(self, commit, head):
+        repo = settings.core.repository
+        try:
+            base = repo.merge_base(commit, head)
+        except (KeyError, ValueError):
+            return False
+        return not base is None and base.hex == commit
+
+    def update(self, head):
+        # returns False if the map can't be stored in the git dir
+        if self.commit == head:
+            return True
+        try:
+            self._update(head)
+        except (IOError, OSError):
+            self.commit = None
+            return False
+        return True
+
+    def _update(self, head):
+        from pygit2 import GIT_SORT_TOPOLOGICAL, GIT_SORT_REVERSE
+        self.load()
+        if self.commit == head:
+            return
+        if not self.commit is None:
+            if not self._is_ancestor(self.commit, head):
+                self.clear()    # the branch was rewritten
+        repo = settings.core.repository
+        walker = repo.walk(head, GIT_SORT_TOPOLOGICAL | GIT_SORT_REVERSE)
+        if not self.commit is None:
+            walker.hide(self.commit)
+        entries = []
+        for i, commit in enumerate(walker, 1):
+            parent = commit.parents[0].hex if commit.parents else None
+            for path, old_oid, new_oid in diff_trees(parent, commit.hex):
+                change = _get_change(old_oid, new_oid)
+                entries.append((list(path), commit.hex, change))
+            if not i % self.CHECKPOINT:
+                self.append(entries)
+                entries = []
+                self.commit = commit.hex
+                self.save()
+        self.append(entries)
+        self.commit = head
+        self.save()
+
+    def _walk(self, head, path):
+        # used if the map can't be stored; only the history of path is
+        # collected, newest first
+        from pygit2 import GIT_SORT_TOPOLOGICAL
+        repo = settings.core.repository
+        entries = []
+        for commit in repo.walk(head, GIT_SORT_TOPOLOGICAL):
+            parent = commit.parents[0].hex if commit.parents else None
+            changes = diff_trees(parent, commit.hex, path[:-1])
+            for subpath, old_oid, new_oid in changes:
+                if list(subpath) == path:
+                    change = _get_change(old_oid, new_oid)
+                    entries.append(HistoryEntry(commit.hex, change))
+        return entries
+
+    def lookup(self, head, path):
+        # returns the entries of path, newest first; lines appended twice by
+        # an interrupted update are skipped
+        path = list(path)
+        if not self.update(head):
+            return self._walk(head, path)
+        entries = []
+        seen = set()
+        try:
+            with open(self.get_bucket_filename(path)) as f:
+                for line in f:
+                    entry_path, commit, change = json.loads(line)
+                    if entry_path == path and not commit in seen:
+                        seen.add(commit)
+                        entries.append(HistoryEntry(commit, change))
+        except IOError:
+            pass
+        entries.reverse()
+        return entries
+
+
+_history_map = None
+
+
+def get_history_map():
+    global _history_map
+    if _history_map is None:
+        _history_map = HistoryMap()
+    return _history_map
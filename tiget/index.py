@@ -0,0 +1,362 @@
+import os
+import json
+import stat
+from bisect import bisect_left, insort
+
+from git_orm import serializer
+from git_orm.quote import unquote_filename
+from git_orm.models import Model, ForeignKey
+
+from tiget.git import get_cache_dir, get_tree, iter_blobs, get_blob_data
+from tiget.changes import get_changes, get_branch_ref
+from tiget.profiling import get_profiler
+from tiget.iostats import get_stats
+
+
+__all__ = [
+    'Index', 'FieldIndex', 'PkIndex', 'CountIndex', 'get_cached_index',
+    'get_cached_indexes', 'get_index', 'get_pk_index', 'get_count_index',
+    'on_change', 'is_indexed', 'unique_prefix_lengths',
+]
+
+
+def is_indexed(field):
+    if field.primary_key or not field.attname:
+        return False
+    return isinstance(field, ForeignKey) or not field.choices is None
+
+
+def _common_prefix_length(a, b):
+    length = 0
+    for x, y in zip(a, b):
+        if not x == y:
+            break
+        length += 1
+    return length
+
+
+def unique_prefix_lengths(keys):
+    """
+    Return the length of the shortest unique prefix for every key.
+
+    >>> sorted(unique_prefix_lengths(['abc', 'abd', 'b']).items())
+    [('abc', 3), ('abd', 3), ('b', 1)]
+    """
+    keys = sorted(set(keys))
+    lengths = {}
+    previous = 0
+    for i, key in enumerate(keys):
+        following = 0
+        if i + 1 < len(keys):
+            following = _common_prefix_length(key, keys[i + 1])
+        lengths[key] = min(len(key), max(previous, following) + 1)
+        previous = following
+    return lengths
+
+
+class Index:
+    # Derived data stored in the git directory; tagged with the commit it
+    # was built from. Indexes in memory follow the branch through the change
+    # feed; on first use an index is brought up to date with the diff from
+    # the commit it was saved for.
+    VERSION = 1
+    dirname = None
+    extension = 'json'
+    binary = False
+
+    def __init__(self, model):
+        self.model = model
+        self.commit = None
+
+    @property
+    def filename(self):
+        name = '{}.{}'.format(self.model._meta.storage_name, self.extension)
+        return os.path.join(get_cache_dir(self.dirname), name)
+
+    def update(self, commit):
+        if self.commit == commit:
+            return
+        with get_profiler().phase('update indexes'):
+            self.load()
+            if self.commit == commit:
+                return
+            if self.commit is None:
+                self.rebuild(commit)
+            else:
+                try:
+                    path = [self.model._meta.storage_name]
+                    self.apply(get_changes(self.commit, commit, path))
+                except (KeyError, ValueError):
+                    self.rebuild(commit)
+            self.commit = commit
+            self.save()
+
+    def notify(self, changeset):
+        if self.commit is None or not self.commit == changeset.old_commit:
+            return
+        try:
+            self.apply(changeset)
+        except (KeyError, ValueError):
+            self.commit = None  # reloaded or rebuilt on next use
+            return
+        self.commit = changeset.new_commit
+        self.save()
+
+    def apply(self, changeset):
+        storage_name = self.model._meta.storage_name
+        for pk, old_oid, new_oid in changeset.iter_objects(storage_name):
+            self.apply_change(pk, old_oid, new_oid)
+
+    def apply_change(self, pk, old_oid, new_oid):
+        raise NotImplementedError
+
+    def rebuild(self, commit):
+        raise NotImplementedError
+
+    def dumps(self):
+        raise NotImplementedError
+
+    def loads(self, data):
+        raise NotImplementedError
+
+    def read(self, f):
+        return json.load(f)
+
+    def write(self, data, f):
+        json.dump(data, f)
+
+    def load(self):
+        mode = 'rb' if self.binary else 'r'
+        try:
+            with open(self.filename, mode) as f:
+                data = self.read(f)
+            if not data['version'] == self.VERSION:
+                return
+            self.loads(data['data'])
+        except (IOError, ValueError, KeyError, TypeError, EOFError):
+            return
+        self.commit = data['commit']
+
+    def save(self):
+        data = {
+            'version': self.VERSION,
+            'commit': self.commit,
+            'data': self.dumps(),
+        }
+        filename = self.filename
+        mode = 'wb' if self.binary else 'w'
+        try:
+            with open(filename + '.tmp', mode) as f:
+                self.write(data, f)
+            os.rename(filename + '.tmp', filename)
+        except IOError:
+            pass    # the index is kept in memory only
+
+
+class FieldIndex(Index):
+    # maps serialized values of low-cardinality fields to primary keys
+    dirname = 'index'
+
+    def __init__(self, model):
+        super().__init__(model)
+        self.fields = [
+            f.name for f in model._meta.writable_fields if is_indexed(f)]
+        self.entries = {}
+
+    def get_field(self, name):
+        for field in self.model._meta.writable_fields:
+            if not field.name in self.fields:
+                continue
+            if name in (field.name, field.attname):
+                return field
+        raise KeyError('{} is not indexed'.format(name))
+
+    def has_field(self, name):
+        try:
+            self.get_field(name)
+        except KeyError:
+            return False
+        return True
+
+    def lookup(self, commit, name, values):
+        field = self.get_field(name)
+        self.update(commit)
+        entries = self.entries[field.name]
+        pks = set()
+        for value in values:
+            if isinstance(value, Model):
+                value = value.pk
+            pks.update(entries.get(field.dumps(value), ()))
+        return set(map(self.model._meta.pk.loads, pks))
+
+    def _parse(self, pk, content):
+        path = [self.model._meta.storage_name, pk]
+        get_stats().read_path(path, len(content))
+        return serializer.loads(content.decode('utf-8'))
+
+    def apply_change(self, pk, old_oid, new_oid):
+        if not old_oid is None:
+            data = self._parse(pk, get_blob_data(old_oid))
+            for name in self.fields:
+                value = data.get(name)
+                pks = self.entries[name].get(value, set())
+                pks.discard(pk)
+                if not pks:
+                    self.entries[name].pop(value, None)
+        if not new_oid is None:
+            data = self._parse(pk, get_blob_data(new_oid))
+            for name in self.fields:
+                self.entries[name].setdefault(data.get(name), set()).add(pk)
+
+    def rebuild(self, commit):
+        entries = {name: {} for name in self.fields}
+        for pk, content in iter_blobs(commit, [self.model._meta.storage_name]):
+            data = self._parse(pk, content)
+            for name in self.fields:
+                entries[name].setdefault(data.get(name), set()).add(pk)
+        self.entries = entries
+
+    def dumps(self):
+        return {
+            name: [[value, sorted(pks)] for value, pks in values.items()]
+            for name, values in self.entries.items()
+        }
+
+    def loads(self, data):
+        if not sorted(data.keys()) == sorted(self.fields):
+            raise ValueError('indexed fields changed')
+        self.entries = {
+            name: {value: set(pks) for value, pks in values}
+            for name, values in data.items()
+        }
+
+
+class PkIndex(Index):
+    # sorted list of serialized primary keys
+    dirname = 'pks'
+
+    def __init__(self, model):
+        super().__init__(model)
+        self.keys = []
+        self._prefix_lengths = None
+
+    def __contains__(self, key):
+        i = bisect_left(self.keys, key)
+        return i < len(self.keys) and self.keys[i] == key
+
+    def lookup(self, commit, pks):
+        self.update(commit)
+        pk_field = self.model._meta.pk
+        return set(pk for pk in pks if pk_field.dumps(pk) in self)
+
+    def startswith(self, commit, prefix):
+        self.update(commit)
+        prefix = self.model._meta.pk.dumps(prefix)
+        keys = []
+        for i in range(bisect_left(self.keys, prefix), len(self.keys)):
+            if not self.keys[i].startswith(prefix):
+                break
+            keys.append(self.keys[i])
+        return set(map(self.model._meta.pk.loads, keys))
+
+    def prefix_lengths(self, commit, extra_keys=()):
+        self.update(commit)
+        extra_keys = set(extra_keys).difference(self.keys)
+        if extra_keys:
+            return unique_prefix_lengths(self.keys + list(extra_keys))
+        if self._prefix_lengths is None:
+            self._prefix_lengths = unique_prefix_lengths(self.keys)
+        return self._prefix_lengths
+
+    def rebuild(self, commit):
+        tree = get_tree(commit, [self.model._meta.storage_name])
+        keys = []
+        if not tree is None:
+            keys = [
+                unquote_filename(entry.name) for entry in tree
+                if entry.filemode & stat.S_IFREG
+            ]
+        self.keys = sorted(keys)
+        self._prefix_lengths = None
+
+    def apply_change(self, pk, old_oid, new_oid):
+        if old_oid is None:
+            insort(self.keys, pk)
+        elif new_oid is None:
+            self.keys.remove(pk)
+        self._prefix_lengths = None
+
+    def dumps(self):
+        return self.keys
+
+    def loads(self, data):
+        self.keys = sorted(data)
+        self._prefix_lengths = None
+
+
+class CountIndex(Index):
+    # number of objects; cheap to load and to update from a tree diff
+    dirname = 'counts'
+
+    def __init__(self, model):
+        super().__init__(model)
+        self.count = 0
+
+    def get_count(self, commit):
+        self.update(commit)
+        return self.count
+
+    def rebuild(self, commit):
+        tree = get_tree(commit, [self.model._meta.storage_name])
+        count = 0
+        if not tree is None:
+            count = sum(
+                1 for entry in tree if entry.filemode & stat.S_IFREG)
+        self.count = count
+
+    def apply_change(self, pk, old_oid, new_oid):
+        if old_oid is None:
+            self.count += 1
+        elif new_oid is None:
+            self.count -= 1
+
+    def dumps(self):
+        return self.count
+
+    def loads(self, data):
+        self.count = int(data)
+
+
+_indexes = {}
+
+
+def get_cached_index(cls, model, *args):
+    key = (cls, model) + args
+    try:
+        index = _indexes[key]
+    except KeyError:
+        index = _indexes[key] = cls(model, *args)
+    return index
+
+
+def get_cached_indexes(cls):
+    return [index for index in _indexes.values() if isinstance(index, cls)]
+
+
+def get_index(model):
+    return get_cached_index(FieldIndex, model)
+
+
+def get_pk_index(model):
+    return get_cached_index(PkIndex, model)
+
+
+def get_count_index(model):
+    return get_cached_index(CountIndex, model)
+
+
+def on_change(changeset):
+    if not changeset.ref == get_branch_ref():
+        return
+    for index in list(_indexes.values()):
+        index.notify(changeset)
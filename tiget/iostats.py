@@ -0,0 +1,194 @@
+from collections import Counter
+from contextlib import contextmanager
+
+
+__all__ = [
+    'IOStats', 'CountingRepository', 'count_repository_io', 'format_size',
+    'get_stats', 'get_last_stats', 'get_session_stats',
+    'reset_session_stats', 'top_level', 'track_io',
+]
+
+# object types as returned by pygit2's Object.type
+GIT_OBJ_COMMIT = 1
+GIT_OBJ_TREE = 2
+GIT_OBJ_BLOB = 3
+
+
+def format_size(size):
+    if size < 1024:
+        return '{} B'.format(size)
+    for unit in ('kB', 'MB', 'GB'):
+        size /= 1024
+        if size < 1024:
+            break
+    return '{:.1f} {}'.format(size, unit)
+
+
+class IOStats:
+    FIELDS = (
+        'commits_read', 'trees_read', 'blobs_read', 'bytes_read',
+        'bytes_decoded', 'blobs_written', 'bytes_written', 'trees_written',
+        'commits_written', 'cache_hits', 'cache_misses',
+    )
+
+    def __init__(self, name=None):
+        self.name = name
+        self.commands = 0
+        for field in self.FIELDS:
+            setattr(self, field, 0)
+        # number of reads per object path, e.g. "tickets/<id>"
+        self.paths = Counter()
+
+    def add(self, other):
+        for field in self.FIELDS:
+            setattr(self, field, getattr(self, field) + getattr(other, field))
+        self.paths.update(other.paths)
+
+    def read_path(self, path, size):
+        self.paths['/'.join(path)] += 1
+        self.bytes_decoded += size
+
+    def summary(self):
+        return (
+            'read {} blobs ({}), {} trees, {} commits; decoded {}; '
+            'wrote {} blobs ({}), {} trees, {} commits; '
+            'cache {} hits, {} misses').format(
+                self.blobs_read, format_size(self.bytes_read),
+                self.trees_read, self.commits_read,
+                format_size(self.bytes_decoded), self.blobs_written,
+                format_size(self.bytes_written), self.trees_written,
+                self.commits_written, self.cache_hits, self.cache_misses)
+
+
+class CountingTreeBuilder:
+    def __init__(self, builder):
+        self._builder = builder
+
+    def __getattr__(self, name):
+        return getattr(self._builder, name)
+
+    def write(self):
+        get_stats().trees_written += 1
+        return self._builder.write()
+
+
+class CountingRepository:
+    # Proxy for a pygit2 repository that counts the objects read and
+    # written. git_orm and tiget only access the repository through
+    # git_orm.get_repository() and settings.core.repository, so wrapping
+    # the repository there counts everything.
+    def __init__(self, repo):
+        self._repo = repo
+
+    def __getattr__(self, name):
+        return getattr(self._repo, name)
+
+    def __contains__(self, oid):
+        return oid in self._repo
+
+    def __getitem__(self, oid):
+        obj = self._repo[oid]
+        stats = get_stats()
+        if obj.type == GIT_OBJ_BLOB:
+            stats.blobs_read += 1
+            stats.bytes_read += obj.size
+        elif obj.type == GIT_OBJ_TREE:
+            stats.trees_read += 1
+        elif obj.type == GIT_OBJ_COMMIT:
+            stats.commits_read += 1
+        return obj
+
+    def create_blob(self, data):
+        stats = get_stats()
+        stats.blobs_written += 1
+        stats.bytes_written += len(data)
+        return self._repo.create_blob(data)
+
+    def TreeBuilder(self, *args):
+        return CountingTreeBuilder(self._repo.TreeBuilder(*args))
+
+    def create_commit(self, *args):
+        get_stats().commits_written += 1
+        return self._repo.create_commit(*args)
+
+
+def count_repository_io():
+    # Wraps the repository of git_orm in a CountingRepository and returns
+    # it. Relies on git_orm 0.4 internals: it has no hook for this and its
+    # transactions get the repository from the module global _repository
+    # through get_repository(). git_orm.set_repository() replaces the
+    # wrapper, so this is called again at the start of every command.
+    import git_orm
+    repo = git_orm.get_repository()
+    if not repo is None and not isinstance(repo, CountingRepository):
+        repo = git_orm._repository = CountingRepository(repo)
+    return repo
+
+
+# the counters of the running command; reads outside of commands (e.g.
+# while loading plugins) are attributed to the session only
+_stats = IOStats()
+_session = IOStats()
+_last = None
+_depth = 0
+
+
+def get_stats():
+    return _stats
+
+
+def get_last_stats():
+    # the stats of the last completed top-level command or None
+    return _last
+
+
+def get_session_stats():
+    # the totals of the session, including the running command
+    stats = IOStats()
+    stats.add(_session)
+    stats.add(_stats)
+    stats.commands = _session.commands
+    return stats
+
+
+def reset_session_stats():
+    global _session, _last
+    _session = IOStats()
+    _last = None
+
+
+@contextmanager
+def track_io(name):
+    # collects the counters of a command; nested commands (e.g. run by
+    # source or time) are counted as part of the outermost one
+    global _stats, _last, _depth
+    if _depth:
+        _depth += 1
+        try:
+            yield _stats
+        finally:
+            _depth -= 1
+        return
+    count_repository_io()
+    _session.add(_stats)
+    _stats = IOStats(name)
+    _depth += 1
+    try:
+        yield _stats
+    finally:
+        _depth -= 1
+        _session.add(_stats)
+        _session.commands += 1
+        _last, _stats = _stats, IOStats()
+
+
+@contextmanager
+def top_level():
+    # commands in the block are counted on their own, even if a command
+    # (e.g. serve) is running
+    global _depth
+    depth, _depth = _depth, 0
+    try:
+        yield
+    finally:
+        _depth = depth
@@ -3,15 +3,13 @@ import sys
 from argparse import ArgumentParser, REMAINDER
 
 from tiget import __version__
-from tiget.git import is_repo_initialized
-from tiget.repl import Repl
-from tiget.conf import settings
-from tiget.utils import print_error, load_file, post_mortem
-from tiget.cmds import CmdError, cmd_execfile, cmd_execv
-from tiget.plugins import load_plugin
+from tiget.profiling import ImportProfiler
 
 
 def load_config():
+    from tiget.conf import settings
+    from tiget.utils import load_file
+    from tiget.cmds import cmd_execfile
     files = ['/etc/tigetrc', '~/.tigetrc', 'tiget:/config/tigetrc']
     repo = settings.core.repository
     if repo and repo.workdir:
@@ -35,15 +33,54 @@ def main():
     parser.add_argument(
         '-v', '--version', action='store_true', dest='print_version',
         default=False, help='print version information')
+    parser.add_argument(
+        '--profile-startup', action='store_true', default=False,
+        help='print an import time breakdown before executing commands')
+    parser.add_argument(
+        '--no-daemon', action='store_false', dest='use_daemon', default=True,
+        help='execute the command even if a tiget daemon is running')
+    parser.add_argument(
+        '-b', '--batch', action='store_true', default=False,
+        help='execute the commands read from stdin in one transaction')
+    parser.add_argument(
+        '--checkpoint', type=int, metavar='N',
+        help='in batch mode, commit every N lines')
     parser.add_argument('cmd', nargs=REMAINDER, help='execute a command')
 
     args = parser.parse_args()
+    if args.batch and args.cmd:
+        parser.error('--batch reads the commands from stdin')
+    if not args.checkpoint is None and not args.batch:
+        parser.error('--checkpoint requires --batch')
 
     if args.print_version:
         print('tiget {}'.format(__version__))
         return
 
-    load_plugin('tiget.core')
+    forward_to_daemon = (
+        args.cmd and args.use_daemon and args.load_config and
+        not args.profile_startup and not args.cmd[0] == 'serve')
+    if forward_to_daemon:
+        from tiget.daemon import find_socket_path, forward
+        path = find_socket_path()
+        if path and os.path.exists(path):
+            status = forward(path, args.cmd)
+            if not status is None:
+                sys.exit(status)
+
+    profiler = ImportProfiler()
+    if args.profile_startup:
+        profiler.install()
+
+    # imported only now, so that --profile-startup includes them
+    with profiler.phase('import modules'):
+        from tiget.git import is_repo_initialized
+        from tiget.utils import print_error, post_mortem
+        from tiget.cmds import CmdError, cmd_execfile, cmd_execv
+        from tiget.plugins import load_plugin
+
+    with profiler.phase('load core plugin'):
+        load_plugin('tiget.core')
 
     if not is_repo_initialized():
         print_error('repository is not initialized; use tiget-setup')
@@ -51,14 +88,21 @@ def main():
 
     try:
         if args.load_config:
-            load_config()
+            with profiler.phase('load configuration'):
+                load_config()
+
+        if args.profile_startup:
+            profiler.uninstall()
+            profiler.report()
 
         if args.cmd:
             cmd_execv(args.cmd)
-        elif args.interactive:
+        elif args.interactive and not args.batch:
+            from tiget.repl import Repl
             Repl().run()
         else:
-            cmd_execfile(sys.stdin)
+            cmd_execfile(
+                sys.stdin, batch=args.batch, checkpoint=args.checkpoint)
     except CmdError as e:
         print_error(e)
         sys.exit(1)
@@ -0,0 +1,234 @@
+import stat
+from collections import namedtuple, OrderedDict
+
+import pygit2
+from git_orm import serializer, transaction, GitError
+from git_orm.quote import unquote_filename
+
+from tiget.conf import settings
+from tiget.plugins import plugins
+from tiget.changes import get_branch_ref, get_remote_ref
+
+
+__all__ = ['MergeError', 'Conflict', 'merge_trees', 'merge']
+
+RESOLUTIONS = ('ours', 'theirs')
+
+
+class MergeError(Exception): pass
+
+
+# field is None if the whole object conflicts, e.g. one side deleted it; the
+# values are serialized field values or, for objects, blob oids
+Conflict = namedtuple('Conflict', ['path', 'field', 'base', 'ours', 'theirs'])
+
+
+def _get_entries(tree):
+    if tree is None:
+        return {}
+    return {entry.name: entry for entry in tree}
+
+
+def _same(a, b):
+    if a is None or b is None:
+        return a is b
+    return a.oid == b.oid
+
+
+def _is_tree(entry):
+    return entry is None or bool(entry.filemode & stat.S_IFDIR)
+
+
+def _is_blob(entry):
+    return entry is None or bool(entry.filemode & stat.S_IFREG)
+
+
+def _get_hex(entry):
+    return None if entry is None else entry.oid.hex
+
+
+def _get_model(storage_name):
+    for plugin in plugins.values():
+        for model in plugin.models.values():
+            if model._meta.storage_name == storage_name:
+                return model
+    return None
+
+
+def _load(repo, entry):
+    if entry is None:
+        return {}
+    return serializer.loads(repo[entry.oid].data.decode('utf-8'))
+
+
+def _dump(model, data):
+    # fields are written in the same order as Model.dumps writes them
+    ordered = OrderedDict()
+    for field in model._meta.writable_fields:
+        if field.name in data:
+            ordered[field.name] = data.pop(field.name)
+    ordered.update(sorted(data.items()))
+    return serializer.dumps(ordered)
+
+
+def merge_blobs(repo, path, base, ours, theirs, resolve=None):
+    # merges the fields of an object changed on both sides; returns the
+    # merged content (None if it can't be built) and a list of conflicts
+    model = _get_model(path[0]) if len(path) == 2 else None
+    if model is None or None in (ours, theirs):
+        conflict = Conflict(
+            path, None, _get_hex(base), _get_hex(ours), _get_hex(theirs))
+        return None, [conflict]
+    try:
+        base_data, our_data, their_data = (
+            _load(repo, entry) for entry in (base, ours, theirs))
+    except (ValueError, UnicodeDecodeError):
+        conflict = Conflict(
+            path, None, _get_hex(base), _get_hex(ours), _get_hex(theirs))
+        return None, [conflict]
+    data = {}
+    conflicts = []
+    for name in sorted(set(our_data).union(their_data)):
+        base_value = base_data.get(name)
+        our_value = our_data.get(name)
+        their_value = their_data.get(name)
+        if our_value == their_value or base_value == their_value:
+            data[name] = our_value
+        elif base_value == our_value:
+            data[name] = their_value
+        else:
+            conflicts.append(
+                Conflict(path, name, base_value, our_value, their_value))
+            data[name] = their_value if resolve == 'theirs' else our_value
+    return _dump(model, data).encode('utf-8'), conflicts
+
+
+def merge_trees(repo, base, ours, theirs, path=(), resolve=None):
+    # Three-way merge of trees, returns the oid of the merged tree and the
+    # list of conflicts. Only entries that differ between the sides are
+    # looked at, subtrees are descended into if both sides changed them.
+    # Conflicting fields are taken from the side given by resolve (ours by
+    # default); whole objects are only replaced if resolve is "theirs".
+    base_entries = _get_entries(base)
+    our_entries = _get_entries(ours)
+    their_entries = _get_entries(theirs)
+    if ours is None:
+        builder = repo.TreeBuilder()
+    else:
+        builder = repo.TreeBuilder(ours.oid)
+    changed = False
+    conflicts = []
+    names = set(our_entries).union(their_entries, base_entries)
+    for name in sorted(names):
+        base_entry = base_entries.get(name)
+        our_entry = our_entries.get(name)
+        their_entry = their_entries.get(name)
+        if _same(our_entry, their_entry) or _same(base_entry, their_entry):
+            continue
+        subpath = path + (unquote_filename(name),)
+        if _same(base_entry, our_entry):
+            oid, filemode = None, None
+            if not their_entry is None:
+                oid, filemode = their_entry.oid, their_entry.filemode
+        elif (_is_tree(base_entry) and not our_entry is None and
+                not their_entry is None and _is_tree(our_entry) and
+                _is_tree(their_entry)):
+            subtrees = [
+                None if entry is None else repo[entry.oid]
+                for entry in (base_entry, our_entry, their_entry)]
+            oid, subconflicts = merge_trees(
+                repo, *subtrees, path=subpath, resolve=resolve)
+            filemode = stat.S_IFDIR
+            conflicts += subconflicts
+        elif all(map(_is_blob, (base_entry, our_entry, their_entry))):
+            content, subconflicts = merge_blobs(
+                repo, subpath, base_entry, our_entry, their_entry, resolve)
+            conflicts += subconflicts
+            if not content is None:
+                oid = repo.create_blob(content)
+                filemode = stat.S_IFREG | 0o644
+            elif resolve == 'theirs':
+                oid, filemode = None, None
+                if not their_entry is None:
+                    oid, filemode = their_entry.oid, their_entry.filemode
+            else:
+                continue
+        else:
+            conflicts.append(Conflict(
+                subpath, None, _get_hex(base_entry), _get_hex(our_entry),
+                _get_hex(their_entry)))
+            if not resolve == 'theirs':
+                continue
+            oid, filemode = None, None
+            if not their_entry is None:
+                oid, filemode = their_entry.oid, their_entry.filemode
+        if oid is None:
+            if name in our_entries:
+                builder.remove(name)
+        else:
+            builder.insert(name, oid, filemode)
+        changed = True
+    if not changed and not ours is None:
+        return ours.oid, conflicts
+    return builder.write(), conflicts
+
+
+def _get_target(repo, ref):
+    try:
+        return repo.lookup_reference(ref).target.hex
+    except KeyError:
+        return None
+
+
+def merge(ref=None, resolve=None):
+    # Merges ref into the tiget branch; ref is either a full ref name or the
+    # name of a remote whose tracking branch is merged (the first remote by
+    # default). Returns a status and the list of conflicts; nothing is
+    # changed if there are conflicts and resolve is None.
+    if not resolve is None and not resolve in RESOLUTIONS:
+        raise ValueError('resolve must be in {}'.format(RESOLUTIONS))
+    try:
+        transaction.current()
+    except GitError:
+        pass
+    else:
+        raise MergeError('can\'t merge while a transaction is running')
+    repo = settings.core.repository
+    if ref is None or not ref.startswith('refs/'):
+        ref = get_remote_ref(ref)
+    theirs = _get_target(repo, ref)
+    if theirs is None:
+        raise MergeError('{} not found; fetch first'.format(ref))
+    branch_ref = get_branch_ref()
+    ours = _get_target(repo, branch_ref)
+    if ours is None:
+        repo.create_reference(branch_ref, theirs)
+        return 'fast-forward', []
+    base = repo.merge_base(ours, theirs)
+    base = None if base is None else base.hex
+    if base == theirs:
+        return 'up-to-date', []
+    elif base == ours:
+        repo.create_reference(branch_ref, theirs, force=True)
+        return 'fast-forward', []
+
+    trees = [
+        None if commit is None else repo[commit].tree
+        for commit in (base, ours, theirs)]
+    tree, conflicts = merge_trees(repo, *trees, resolve=resolve)
+    if conflicts and resolve is None:
+        return 'conflict', conflicts
+    try:
+        name = repo.config['user.name']
+        email = repo.config['user.email']
+    except KeyError as e:
+        raise MergeError('{} not found in git config'.format(e))
+    signature = pygit2.Signature(name, email)
+    message = 'Merge {}'.format(ref)
+    if conflicts:
+        message += '\n\n{} conflicts resolved using {}'.format(
+            len(conflicts), resolve)
+    repo.create_commit(
+        branch_ref, signature, signature, message, tree, [ours, theirs],
+        'utf-8')
+    return 'merged', conflicts
@@ -1,12 +1,13 @@
-import pkg_resources
 from collections import OrderedDict
 from inspect import ismodule, isclass
 
+from tiget.plugins import manifest
 from tiget.plugins.deep_reload import deep_reload
 from tiget.plugins.settings import Settings
 
 
 plugins = OrderedDict()
+cmds = {}
 
 
 def _get_subclasses(mod, klass):
@@ -27,6 +28,7 @@ class Plugin:
     def load(self):
         self.models = {}
         self.cmds = {}
+        self.change_subscribers = []
         self.settings = Settings()
         try:
             load = self.mod.load
@@ -56,6 +58,10 @@ class Plugin:
             self.add_model(model)
 
     def add_model(self, model):
+        from git_orm.models.queryset import QuerySet
+        from tiget.queryset import IndexedQuerySet
+        if type(model.objects) is QuerySet:
+            model.objects = IndexedQuerySet(model)
         self.models[model.__name__.lower()] = model
 
     def add_cmds(self, cmds):
@@ -70,6 +76,11 @@ class Plugin:
         for name in cmd_class.names:
             self.cmds[name] = cmd_class(name)
 
+    def add_change_subscriber(self, subscriber):
+        # subscriber is called with a tiget.changes.ChangeSet whenever a
+        # command moved the tiget branch or its remote tracking branch
+        self.change_subscribers.append(subscriber)
+
     def add_settings(self, **kwargs):
         for name, variable in kwargs.items():
             self.add_setting(name, variable)
@@ -78,26 +89,54 @@ class Plugin:
         self.settings.variables[name] = variable
 
 
+def _update_cmds():
+    merged = {}
+    for plugin in plugins.values():
+        for name, cmd in plugin.cmds.items():
+            merged.setdefault(name, cmd)
+    cmds.clear()
+    cmds.update(merged)
+
+
+def _load_entry_point(name):
+    for ep in manifest.iter_entry_points('tiget.plugins', name):
+        try:
+            return ep.load()
+        except ImportError:
+            # the cached manifest might be outdated; rescan once
+            manifest.invalidate()
+            for ep in manifest.iter_entry_points('tiget.plugins', name):
+                return ep.load()
+            raise
+    return None
+
+
 def load_plugin(name):
-    for ep in pkg_resources.iter_entry_points('tiget.plugins', name):
-        mod = ep.load()
-        name = ep.name
-        break
-    else:
+    mod = _load_entry_point(name)
+    if mod is None:
         mod = __import__(name, fromlist=['__name__'])
         name = mod.__name__.rpartition('.')[2]
     if name in plugins:
         raise ImportError('plugin "{}" is already loaded'.format(name))
     plugin = Plugin(mod, name)
     plugins[name] = plugin
-    plugin.load()
+    try:
+        plugin.load()
+    finally:
+        _update_cmds()
 
 
 def unload_plugin(name):
     plugin = plugins.pop(name)
-    plugin.unload()
+    try:
+        plugin.unload()
+    finally:
+        _update_cmds()
 
 
 def reload_plugin(name):
     plugin = plugins[name]
-    plugin.reload()
+    try:
+        plugin.reload()
+    finally:
+        _update_cmds()
@@ -0,0 +1,103 @@
+import os
+import sys
+import json
+from hashlib import sha1
+from collections import namedtuple
+from importlib import import_module
+
+
+__all__ = ['EntryPoint', 'iter_entry_points', 'invalidate']
+
+MANIFEST_VERSION = 1
+
+
+class EntryPoint(namedtuple('EntryPoint', ['name', 'module_name', 'attrs'])):
+    def load(self):
+        obj = import_module(self.module_name)
+        for attr in self.attrs:
+            obj = getattr(obj, attr)
+        return obj
+
+
+def get_manifest_path():
+    cache_home = os.environ.get('XDG_CACHE_HOME', '~/.cache')
+    return os.path.join(
+        os.path.expanduser(cache_home), 'tiget', 'entry_points.json')
+
+
+def get_manifest_key():
+    # installing or removing a distribution changes the mtime of the
+    # directory it is installed in
+    state = [sys.executable, sys.version]
+    for path in sys.path:
+        try:
+            mtime = os.stat(path or '.').st_mtime
+        except OSError:
+            mtime = None
+        state.append([path, mtime])
+    return sha1(json.dumps(state).encode('utf-8')).hexdigest()
+
+
+def _scan(group):
+    import pkg_resources
+    return [
+        [ep.name, ep.module_name, list(ep.attrs)]
+        for ep in pkg_resources.iter_entry_points(group)
+    ]
+
+
+def _read_manifest(key):
+    try:
+        with open(get_manifest_path()) as f:
+            manifest = json.load(f)
+    except (IOError, ValueError):
+        return {}
+    if not isinstance(manifest, dict):
+        return {}
+    if not manifest.get('version') == MANIFEST_VERSION:
+        return {}
+    if not manifest.get('key') == key:
+        return {}
+    return manifest.get('groups', {})
+
+
+def _write_manifest(key, groups):
+    filename = get_manifest_path()
+    manifest = {'version': MANIFEST_VERSION, 'key': key, 'groups': groups}
+    try:
+        os.makedirs(os.path.dirname(filename), exist_ok=True)
+        with open(filename + '.tmp', 'w') as f:
+            json.dump(manifest, f)
+        os.rename(filename + '.tmp', filename)
+    except (IOError, OSError):
+        pass
+
+
+_groups = None
+
+
+def _get_group(group):
+    global _groups
+    key = get_manifest_key()
+    if _groups is None or not _groups.get('key') == key:
+        _groups = {'key': key, 'groups': _read_manifest(key)}
+    groups = _groups['groups']
+    if not group in groups:
+        groups[group] = _scan(group)
+        _write_manifest(key, groups)
+    return groups[group]
+
+
+def iter_entry_points(group, name=None):
+    for ep_name, module_name, attrs in _get_group(group):
+        if name is None or ep_name == name:
+            yield EntryPoint(ep_name, module_name, tuple(attrs))
+
+
+def invalidate():
+    global _groups
+    _groups = None
+    try:
+        os.remove(get_manifest_path())
+    except OSError:
+        pass
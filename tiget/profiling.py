@@ -0,0 +1,205 @@
+import sys
+import time
+import pstats
+import cProfile
+import builtins
+from contextlib import contextmanager
+
+
+__all__ = [
+    'ImportProfiler', 'CmdProfiler', 'get_profiler', 'profiling',
+    'profile_iter',
+]
+
+# CPU time of the process; time.clock is the best there is on Python 3.2
+process_time = getattr(time, 'process_time', None) or time.clock
+
+
+class ImportProfiler:
+    def __init__(self):
+        self.imports = {}
+        self.phases = []
+        self._stack = []
+        self._import = builtins.__import__
+        self.started_at = time.time()
+
+    def install(self):
+        builtins.__import__ = self._timed_import
+
+    def uninstall(self):
+        builtins.__import__ = self._import
+
+    def _timed_import(self, name, globals=None, locals=None, fromlist=(),
+                      level=0):
+        if level:
+            package = (globals or {}).get('__package__') or ''
+            if level > 1:
+                package = package.rsplit('.', level - 1)[0]
+            fullname = '{}.{}'.format(package, name) if name else package
+        else:
+            fullname = name
+        if fullname in sys.modules:
+            return self._import(name, globals, locals, fromlist, level)
+        self._stack.append(0)
+        start = time.time()
+        try:
+            return self._import(name, globals, locals, fromlist, level)
+        finally:
+            elapsed = time.time() - start
+            children = self._stack.pop()
+            if self._stack:
+                self._stack[-1] += elapsed
+            own, cumulative = self.imports.get(fullname, (0, 0))
+            self.imports[fullname] = (
+                own + elapsed - children, cumulative + elapsed)
+
+    @contextmanager
+    def phase(self, name):
+        start = time.time()
+        try:
+            yield
+        finally:
+            self.phases.append((name, time.time() - start))
+
+    def report(self, limit=20, file=None):
+        file = file or sys.stderr
+        total = time.time() - self.started_at
+        print('startup: {:.1f} ms'.format(total * 1000), file=file)
+        for name, elapsed in self.phases:
+            print('  {:<26} {:>8.1f} ms'.format(name, elapsed * 1000),
+                  file=file)
+        print('imports: {:>8} {:>10}  module'.format('self', 'cumulative'),
+              file=file)
+        imports = sorted(
+            self.imports.items(), key=lambda x: x[1][1], reverse=True)
+        for name, (own, cumulative) in imports[:limit]:
+            print('         {:>5.1f} ms {:>7.1f} ms  {}'.format(
+                own * 1000, cumulative * 1000, name), file=file)
+
+
+class _NullPhase:
+    def __enter__(self):
+        pass
+
+    def __exit__(self, type, value, traceback):
+        pass
+
+
+class NullProfiler:
+    # stands in while no command is profiled, so instrumented code doesn't
+    # have to check
+    active = False
+    _phase = _NullPhase()
+
+    def phase(self, name):
+        return self._phase
+
+
+class _Phase:
+    def __init__(self, profiler, name):
+        self.profiler = profiler
+        self.name = name
+
+    def __enter__(self):
+        self.profiler._enter()
+
+    def __exit__(self, type, value, traceback):
+        self.profiler._exit(self.name)
+
+
+class CmdProfiler:
+    # Wall and CPU time spent in the phases of a command. Phases may nest;
+    # the time of a phase excludes the time of the phases inside of it, so
+    # the phases add up to the total.
+    active = True
+
+    def __init__(self, cprofile=False):
+        self.phases = {}
+        self._stack = []
+        self.profile = cProfile.Profile() if cprofile else None
+        self.wall = self.cpu = 0
+
+    def phase(self, name):
+        return _Phase(self, name)
+
+    def _enter(self):
+        self._stack.append([time.time(), process_time(), 0, 0])
+
+    def _exit(self, name):
+        wall_start, cpu_start, child_wall, child_cpu = self._stack.pop()
+        wall = time.time() - wall_start
+        cpu = process_time() - cpu_start
+        calls, own_wall, own_cpu = self.phases.get(name, (0, 0, 0))
+        self.phases[name] = (
+            calls + 1, own_wall + wall - child_wall, own_cpu + cpu - child_cpu)
+        if self._stack:
+            self._stack[-1][2] += wall
+            self._stack[-1][3] += cpu
+
+    def start(self):
+        self._enter()
+        if self.profile:
+            self.profile.enable()
+
+    def stop(self):
+        if self.profile:
+            self.profile.disable()
+        wall_start, cpu_start, _, _ = self._stack[0]
+        self.wall = time.time() - wall_start
+        self.cpu = process_time() - cpu_start
+        # everything outside the named phases is the command itself
+        self._exit('command')
+
+    def report(self, title, file=None):
+        file = file or sys.stderr
+        print('{}: {:.1f} ms wall, {:.1f} ms cpu'.format(
+            title, self.wall * 1000, self.cpu * 1000), file=file)
+        phases = sorted(
+            self.phases.items(), key=lambda x: x[1][1], reverse=True)
+        for name, (calls, wall, cpu) in phases:
+            print('  {:<20} {:>8.1f} ms {:>8.1f} ms cpu {:>7}x'.format(
+                name, wall * 1000, cpu * 1000, calls), file=file)
+
+    def print_top(self, limit, file=None):
+        stats = pstats.Stats(self.profile, stream=file or sys.stderr)
+        stats.sort_stats('tottime').print_stats(limit)
+
+    def dump(self, filename):
+        self.profile.dump_stats(filename)
+
+
+_profiler = NullProfiler()
+
+
+def get_profiler():
+    return _profiler
+
+
+@contextmanager
+def profiling(cprofile=False):
+    # profiles the block with a new CmdProfiler; an enclosing profiler is
+    # suspended meanwhile (only one cProfile may run at a time)
+    global _profiler
+    previous, _profiler = _profiler, CmdProfiler(cprofile)
+    if previous.active and previous.profile:
+        previous.profile.disable()
+    _profiler.start()
+    try:
+        yield _profiler
+    finally:
+        _profiler.stop()
+        _profiler = previous
+        if previous.active and previous.profile:
+            previous.profile.enable()
+
+
+def profile_iter(name, iterable):
+    # times every step of iterable as phase name
+    iterator = iter(iterable)
+    while True:
+        with _profiler.phase(name):
+            try:
+                item = next(iterator)
+            except StopIteration:
+                return
+        yield item
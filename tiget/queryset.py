@@ -0,0 +1,401 @@
+from functools import reduce
+
+from git_orm import serializer, transaction, GitError
+from git_orm.quote import quote_filename, unquote_filename
+from git_orm.models import Model, ForeignKey
+from git_orm.models.fields import Field
+from git_orm.models.queryset import QuerySet, ObjCache
+from git_orm.models.query import (
+    Q, Inversion, Intersection, Union, Slice, Ordered)
+
+from tiget.git import get_blob_oid
+from tiget.index import get_index, get_pk_index, get_count_index
+from tiget.filters import Contains
+from tiget.profiling import get_profiler
+from tiget.iostats import get_stats
+from tiget.snapshot import snapshot
+from tiget.cache import get_object_cache, get_object_store
+
+
+__all__ = [
+    'IndexedQuerySet', 'QueryPlan', 'get_prefix_lengths', 'count_objects',
+    'get_referrers',
+]
+
+INDEXED_OPERATORS = ('exact', 'in')
+
+
+def _is_pointwise(query):
+    # a query is pointwise if it decides about every object on its own, so
+    # narrowing the set of candidates beforehand does not change the result
+    if isinstance(query, (Q, Contains)):
+        return True
+    elif isinstance(query, (Intersection, Union)):
+        return all(_is_pointwise(q) for q in query.subqueries)
+    elif isinstance(query, (Inversion, Ordered)):
+        return _is_pointwise(query.subquery)
+    return False
+
+
+def _get_commit():
+    trans = transaction.current()
+    return trans.parents[0].hex if trans.parents else None
+
+
+def _get_pending_pks(model):
+    # objects changed in the running transaction are not in the index yet
+    trans = transaction.current()
+    path = [quote_filename(model._meta.storage_name)]
+    names = trans.get_memory_tree(path).blobs.keys()
+    return set(model._meta.pk.loads(unquote_filename(name)) for name in names)
+
+
+def get_prefix_lengths(model):
+    commit = _get_commit()
+    if commit is None:
+        return {}
+    pk_field = model._meta.pk
+    pending = map(pk_field.dumps, _get_pending_pks(model))
+    lengths = get_pk_index(model).prefix_lengths(commit, pending)
+    return {pk_field.loads(key): length for key, length in lengths.items()}
+
+
+def count_objects(model):
+    pending = _get_pending_pks(model)
+    commit = _get_commit()
+    if commit is None:
+        return len(pending)
+    count = get_count_index(model).get_count(commit)
+    if pending:
+        existing = get_pk_index(model).lookup(commit, pending)
+        count += len(pending) - len(existing)
+    return count
+
+
+def get_referrers(instance, models):
+    # yields (model, field, queryset) for every foreign key of the given
+    # models that points to the model of instance; the field index maps the
+    # target's pk to the referring objects, so only those are loaded
+    for model in models:
+        for field in model._meta.writable_fields:
+            if not isinstance(field, ForeignKey):
+                continue
+            if field.target is type(instance):
+                queryset = model.objects.filter(**{field.attname: instance.pk})
+                yield model, field, queryset
+
+
+class LazyObjCache(ObjCache):
+    # lists the primary keys only if the query can't be served by an index
+    def __init__(self, model):
+        self.model = model
+        self.cache = {}
+        self.pk_names = ('pk', model._meta.pk.attname)
+        self._pks = None
+        # objects loaded from blobs and from the object cache or store
+        self.blobs_read = 0
+        self.cache_hits = 0
+
+    def __getitem__(self, pk):
+        # same as ObjCache.__getitem__, but the parsed fields are cached by
+        # blob oid for the whole session and taken from the object store if
+        # possible; reading and parsing are profiled separately
+        try:
+            return self.cache[pk]
+        except KeyError:
+            pass
+        profiler = get_profiler()
+        stats = get_stats()
+        obj = self.model(pk=pk)
+        trans = transaction.current()
+        object_cache = get_object_cache()
+        oid = get_blob_oid(trans, obj.path)
+        data = None
+        if not oid is None:
+            data = object_cache.get(oid)
+            if data is None:
+                store = get_object_store(self.model)
+                data = store.get(_get_commit(), obj.path[1], oid)
+                if not data is None:
+                    object_cache.put(oid, data)
+            if data is None:
+                stats.cache_misses += 1
+            else:
+                stats.cache_hits += 1
+                self.cache_hits += 1
+        if data is None:
+            self.blobs_read += 1
+            with profiler.phase('read objects'):
+                try:
+                    content = trans.get_blob(obj.path)
+                except GitError:
+                    raise self.model.DoesNotExist(
+                        'object with pk {} does not exist'.format(pk))
+            stats.read_path(obj.path, len(content))
+            with profiler.phase('deserialize'):
+                try:
+                    data = serializer.loads(content.decode('utf-8'))
+                except ValueError as e:
+                    raise self.model.InvalidObject(e)
+            if not oid is None:
+                object_cache.put(oid, data)
+                store = get_object_store(self.model)
+                store.put(_get_commit(), obj.path[1], oid, data)
+        with profiler.phase('deserialize'):
+            obj.loads(data)
+        self.cache[pk] = obj
+        return obj
+
+    @property
+    def pks(self):
+        if self._pks is None:
+            trans = transaction.current()
+            pks = trans.list_blobs([self.model._meta.storage_name])
+            self._pks = set(map(self.model._meta.pk.loads, pks))
+        return self._pks
+
+
+class QueryPlan:
+    # describes how the query of a queryset was executed last time
+    def __init__(self, query, candidates, obj_cache):
+        self.query = query
+        self.indexed = not candidates is None
+        self.candidates = candidates
+        self.obj_cache = obj_cache
+
+    def __str__(self):
+        if self.indexed:
+            plan = 'index ({} candidates)'.format(len(self.candidates))
+        else:
+            plan = 'scan ({} objects)'.format(len(self.obj_cache.pks))
+        return 'query: {!r}\nplan: {}\nblobs read: {}\ncache hits: {}'.format(
+            self.query, plan, self.obj_cache.blobs_read,
+            self.obj_cache.cache_hits)
+
+
+class IndexedQuerySet(QuerySet):
+    plan = None
+
+    def _chain(self, queryset):
+        return self.__class__(self.model, queryset.query)
+
+    def __or__(self, other):
+        return self._chain(super().__or__(other))
+
+    def __and__(self, other):
+        return self._chain(super().__and__(other))
+
+    def __invert__(self):
+        return self._chain(super().__invert__())
+
+    @snapshot()
+    def __getitem__(self, key):
+        if isinstance(key, slice):
+            return self.__class__(self.model, self.query[key])
+        elif isinstance(key, int):
+            try:
+                stop = key + 1
+                if stop == 0:
+                    stop = None
+                queryset = self.__class__(self.model, self.query[key:stop])
+                return queryset.get()
+            except self.model.DoesNotExist:
+                raise IndexError('index out of range')
+        else:
+            raise TypeError('indices must be integers')
+
+    @snapshot()
+    def __iter__(self):
+        return super().__iter__()
+
+    @snapshot()
+    def get(self, *args, **kwargs):
+        return super().get(*args, **kwargs)
+
+    @snapshot()
+    def exists(self, *args, **kwargs):
+        return super().exists(*args, **kwargs)
+
+    @snapshot()
+    def count(self, *args, **kwargs):
+        return super().count(*args, **kwargs)
+
+    def _filter(self, *args, **kwargs):
+        # git_orm 0.4 caches the target of a foreign key on the descriptor
+        # of the class, so a scan would compare every object's target with
+        # the first one loaded; compare primary keys instead
+        conditions = {}
+        for key, value in kwargs.items():
+            key, value = self._dereference(key, value)
+            conditions[key] = value
+        return super()._filter(*args, **conditions)
+
+    def _dereference(self, key, value):
+        name, sep, op = key.partition('__')
+        for field in self.model._meta.writable_fields:
+            if isinstance(field, ForeignKey) and field.name == name:
+                break
+        else:
+            return key, value
+        if op in ('', 'exact') and isinstance(value, Model):
+            value = value.pk
+        elif op == 'in' and isinstance(value, (tuple, list, set, frozenset)):
+            value = tuple(v.pk if isinstance(v, Model) else v for v in value)
+        else:
+            return key, value
+        return field.attname + sep + op, value
+
+    def filter(self, *args, **kwargs):
+        return self._chain(super().filter(*args, **kwargs))
+
+    def exclude(self, *args, **kwargs):
+        return self._chain(super().exclude(*args, **kwargs))
+
+    def order_by(self, *order_by):
+        return self._chain(super().order_by(*order_by))
+
+    def iterator(self):
+        # unlike __iter__, objects are loaded one at a time and not kept
+        with snapshot():
+            pks, obj_cache = self._execute()
+            for pk in pks:
+                obj = obj_cache[pk]
+                obj_cache.cache.pop(pk, None)
+                yield obj
+
+    @transaction.wrap()
+    def bulk_create(self, instances):
+        count = self._bulk_save(instances)
+        if count:
+            transaction.current().add_message('Create {} {}'.format(
+                count, self.model._meta.storage_name))
+        return count
+
+    @transaction.wrap()
+    def bulk_update(self, instances):
+        count = self._bulk_save(instances)
+        if count:
+            transaction.current().add_message('Edit {} {}'.format(
+                count, self.model._meta.storage_name))
+        return count
+
+    @transaction.wrap()
+    def bulk_import(self, instances):
+        # like bulk_create, but objects with the pk of an existing object
+        # overwrite it
+        trans = transaction.current()
+        existing = 0
+
+        def _count_existing(instances):
+            nonlocal existing
+            for instance in instances:
+                if isinstance(instance, self.model) and \
+                        trans.exists(instance.path):
+                    existing += 1
+                yield instance
+        count = self._bulk_save(_count_existing(instances))
+        if count:
+            trans.add_message('Import {} {} ({} created, {} updated)'.format(
+                count, self.model._meta.storage_name, count - existing,
+                existing))
+        return count
+
+    def _bulk_save(self, instances):
+        # foreign keys are checked against the transaction tree, so objects
+        # created earlier in the same batch are found without a query
+        trans = transaction.current()
+        count = 0
+        for instance in instances:
+            if not isinstance(instance, self.model):
+                raise TypeError('expected {} instance, got {!r}'.format(
+                    self.model.__name__, instance))
+            for field in self.model._meta.writable_fields:
+                value = getattr(instance, field.attname)
+                try:
+                    if isinstance(field, ForeignKey):
+                        Field.validate(field, value)
+                        self._validate_foreign_key(trans, field, value)
+                    else:
+                        field.validate(value)
+                except ValueError as e:
+                    raise self.model.InvalidObject(e)
+            serialized = instance.dumps(include_hidden=True, include_pk=False)
+            trans.set_blob(instance.path, serialized.encode('utf-8'))
+            count += 1
+        return count
+
+    def _validate_foreign_key(self, trans, field, value):
+        if value is None:
+            return
+        target = field.target
+        path = [target._meta.storage_name, target._meta.pk.dumps(value)]
+        if not trans.exists(path):
+            raise ValueError('{} with pk={!r} does not exist'.format(
+                target.__name__, value))
+
+    def _execute(self, *args, **kwargs):
+        query = self.query & self._filter(*args, **kwargs)
+        obj_cache = LazyObjCache(self.model)
+        candidates = self._get_candidates(query)
+        if candidates is None:
+            pks = obj_cache.pks
+        else:
+            # objects can't be deleted, so every candidate exists
+            pks = candidates = candidates | _get_pending_pks(self.model)
+        self.plan = QueryPlan(query, candidates, obj_cache)
+        return query.execute(obj_cache, pks), obj_cache
+
+    def _get_candidates(self, query):
+        while isinstance(query, (Ordered, Slice)):
+            query = query.subquery
+        if not _is_pointwise(query):
+            return None
+        commit = _get_commit()
+        if commit is None:
+            return None
+        return self._lookup(commit, query)
+
+    def _lookup_pk(self, commit, op, value):
+        index = get_pk_index(self.model)
+        if op == 'exact' and isinstance(value, str):
+            return index.lookup(commit, (value,))
+        elif op == 'in' and isinstance(value, (tuple, list, set, frozenset)):
+            return index.lookup(commit, value)
+        elif op == 'startswith' and isinstance(value, str):
+            return index.startswith(commit, value)
+        return None
+
+    def _lookup(self, commit, query):
+        if isinstance(query, Q):
+            index = get_index(self.model)
+            pk_names = ('pk', self.model._meta.pk.attname)
+            candidates = None
+            for field, op, value in query.conditions:
+                if field in pk_names:
+                    pks = self._lookup_pk(commit, op, value)
+                    if not pks is None:
+                        candidates = (
+                            pks if candidates is None else candidates & pks)
+                    continue
+                if not op in INDEXED_OPERATORS or not index.has_field(field):
+                    continue
+                if op == 'exact':
+                    value = (value,)
+                elif not isinstance(value, (tuple, list, set, frozenset)):
+                    continue
+                try:
+                    pks = index.lookup(commit, field, value)
+                except (TypeError, ValueError, AttributeError):
+                    continue
+                candidates = pks if candidates is None else candidates & pks
+            return candidates
+        elif isinstance(query, Intersection):
+            results = [self._lookup(commit, q) for q in query.subqueries]
+            results = [pks for pks in results if not pks is None]
+            if results:
+                return reduce(lambda x, y: x & y, results)
+        elif isinstance(query, Union):
+            results = [self._lookup(commit, q) for q in query.subqueries]
+            if not None in results:
+                return reduce(lambda x, y: x | y, results, set())
+        return None
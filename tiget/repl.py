@@ -7,9 +7,10 @@ from colors import blue
 
 from tiget import __version__
 from tiget.conf import settings
-from tiget.plugins import plugins
+from tiget.plugins import cmds
 from tiget.cmds import CmdError, aliases, cmd_exec
 from tiget.utils import print_error, post_mortem
+from tiget.iostats import get_last_stats
 
 
 class Repl:
@@ -18,10 +19,9 @@ class Repl:
         self.lineno = 0
 
     def complete(self, text, state):
-        cmds = set(aliases.keys())
-        for plugin in plugins.values():
-            cmds.update(plugin.cmds.keys())
-        options = list(sorted(cmd for cmd in cmds if cmd.startswith(text)))
+        names = set(aliases.keys())
+        names.update(cmds.keys())
+        options = list(sorted(name for name in names if name.startswith(text)))
         if state < len(options):
             return options[state] + ' '
         return None
@@ -69,11 +69,15 @@ class Repl:
                 continue
             except EOFError:
                 break
+            previous_stats = get_last_stats()
             try:
                 cmd_exec(line)
             except CmdError as e:
                 print_error('"<repl>", line {}: {}'.format(self.lineno, e))
             except:
                 post_mortem()
+            stats = get_last_stats()
+            if settings.core.perf_summary and not stats is previous_stats:
+                print(stats.summary(), file=sys.stderr)
         readline.set_history_length(settings.core.history_limit)
         readline.write_history_file(self.histfile)
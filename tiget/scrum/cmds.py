@@ -3,11 +3,21 @@ from functools import wraps
 from git_orm import transaction
 
 from tiget.cmds import Cmd
+from tiget.git import get_head
 from tiget.table import Table
-from tiget.scrum.models import Ticket, User
+from tiget.search import get_search_index
+from tiget.snapshot import snapshot
+from tiget.queryset import get_prefix_lengths
+from tiget.scrum.models import Ticket, User, Comment
 from tiget.utils import open_in_editor
 
 
+SEARCH_FIELDS = (
+    (Ticket, ('summary', 'description')),
+    (Comment, ('text',)),
+)
+
+
 def require_user(fn):
     @wraps(fn)
     def _inner(self, args):
@@ -42,7 +52,7 @@ class Mine(Cmd):
     def setup(self):
         self.parser.add_argument('-a', '--all', action='store_true')
 
-    @transaction.wrap()
+    @snapshot()
     @require_user
     def do(self, args, user):
         tickets = Ticket.objects.filter(owner=user)
@@ -50,7 +60,8 @@ class Mine(Cmd):
             tickets = tickets.filter(status__in=('new', 'wtf'))
         table = Table.from_queryset(tickets, fields=(
             'id', 'summary', 'sprint', 'status', 'type'))
-        self.print(table.render())
+        for line in table.render_lines():
+            self.write(line)
 
 
 class New(Cmd):
@@ -60,6 +71,9 @@ class New(Cmd):
         self.parser.add_argument(
             'type', nargs='?', default=Ticket._meta.get_field('type').default)
 
+    def needs_terminal(self, args):
+        return True
+
     def do(self, args):
         try:
             ticket = Ticket(type=args.type)
@@ -82,6 +96,47 @@ class SetTicketStatus(Cmd):
 
     @transaction.wrap()
     def do(self, args):
-        ticket = Ticket.objects.get(id__startswith=args.ticket_id)
+        try:
+            ticket = Ticket.objects.get(id__startswith=args.ticket_id)
+        except (Ticket.DoesNotExist, Ticket.MultipleObjectsReturned) as e:
+            raise self.error(e)
         ticket.status = self.name
         ticket.save()
+
+
+class Search(Cmd):
+    description = 'search ticket summaries, descriptions and comments'
+
+    def setup(self):
+        self.parser.add_argument(
+            '-l', '--limit', type=int, default=20,
+            help='maximum number of results')
+        self.parser.add_argument('terms', nargs='+')
+
+    @snapshot()
+    def do(self, args):
+        commit = get_head()
+        if commit is None:
+            return
+        query = ' '.join(args.terms)
+        results = []
+        for model, fields in SEARCH_FIELDS:
+            index = get_search_index(model, fields)
+            for score, pk in index.search(commit, query):
+                results.append((score, model, pk))
+        results.sort(key=lambda x: x[0], reverse=True)
+
+        prefix_lengths = get_prefix_lengths(Ticket)
+        table = Table('score', 'ticket', 'match')
+        for score, model, pk in results[:args.limit]:
+            obj = model.objects.get(pk=pk)
+            if model is Comment:
+                ticket_id = obj.ticket_id
+                text = 'comment by {}: {}'.format(obj.author_email, obj.text)
+            else:
+                ticket_id = obj.id
+                text = obj.summary
+            ticket_id = ticket_id[:prefix_lengths.get(ticket_id)]
+            table.add_row('{:.2f}'.format(score), ticket_id, text)
+        for line in table.render_lines():
+            self.write(line)
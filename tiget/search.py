@@ -0,0 +1,184 @@
+import os
+import re
+import json
+import math
+import shutil
+from zlib import crc32
+from collections import Counter
+
+from git_orm import serializer
+
+from tiget.git import get_cache_dir, iter_blobs, get_blob_data
+from tiget.index import Index, get_cached_index
+from tiget.iostats import get_stats
+
+
+__all__ = ['SearchIndex', 'get_search_index', 'tokenize']
+
+TOKEN_RE = re.compile(r'\w\w+')
+
+
+def tokenize(text):
+    """
+    >>> tokenize('Crash on start-up, see #12')
+    ['crash', 'on', 'start', 'up', 'see', '12']
+    """
+    return TOKEN_RE.findall(text.lower()) if text else []
+
+
+class SearchIndex(Index):
+    # Inverted index over some text fields of a model. Postings are split
+    # into buckets by term hash, so a query only loads the buckets of its
+    # terms and an update only rewrites the buckets it touched.
+    dirname = 'search'
+    BUCKETS = 256
+
+    # BM25 parameters
+    K1 = 1.2
+    B = 0.75
+
+    def __init__(self, model, fields):
+        super().__init__(model)
+        self.fields = list(fields)
+        self.clear()
+
+    def clear(self):
+        self.documents = 0
+        self.total_length = 0
+        self.buckets = {}
+        self.dirty = set()
+
+    @property
+    def path(self):
+        return get_cache_dir(self.dirname, self.model._meta.storage_name)
+
+    @property
+    def filename(self):
+        return os.path.join(self.path, 'meta.json')
+
+    def get_bucket(self, term):
+        number = crc32(term.encode('utf-8')) % self.BUCKETS
+        try:
+            return self.buckets[number]
+        except KeyError:
+            pass
+        filename = os.path.join(self.path, '{:02x}.json'.format(number))
+        try:
+            with open(filename) as f:
+                bucket = json.load(f)
+        except (IOError, ValueError):
+            bucket = {}
+        self.buckets[number] = bucket
+        return bucket
+
+    def get_terms(self, pk, content):
+        path = [self.model._meta.storage_name, pk]
+        get_stats().read_path(path, len(content))
+        data = serializer.loads(content.decode('utf-8'))
+        terms = []
+        for name in self.fields:
+            terms += tokenize(data.get(name))
+        return terms
+
+    def add(self, pk, content):
+        terms = self.get_terms(pk, content)
+        self.documents += 1
+        self.total_length += len(terms)
+        for term, count in Counter(terms).items():
+            self.get_bucket(term).setdefault(term, {})[pk] = [
+                count, len(terms)]
+            self.dirty.add(crc32(term.encode('utf-8')) % self.BUCKETS)
+
+    def remove(self, pk, content):
+        terms = self.get_terms(pk, content)
+        self.documents -= 1
+        self.total_length -= len(terms)
+        for term in set(terms):
+            bucket = self.get_bucket(term)
+            postings = bucket.get(term, {})
+            postings.pop(pk, None)
+            if not postings:
+                bucket.pop(term, None)
+            self.dirty.add(crc32(term.encode('utf-8')) % self.BUCKETS)
+
+    def rebuild(self, commit):
+        self.clear()
+        # every bucket is rewritten, stale ones must not survive
+        self.buckets = {number: {} for number in range(self.BUCKETS)}
+        path = [self.model._meta.storage_name]
+        for pk, content in iter_blobs(commit, path):
+            self.add(pk, content)
+        self.dirty = set(self.buckets)
+
+    def apply_change(self, pk, old_oid, new_oid):
+        if not old_oid is None:
+            self.remove(pk, get_blob_data(old_oid))
+        if not new_oid is None:
+            self.add(pk, get_blob_data(new_oid))
+
+    def dumps(self):
+        return {
+            'fields': self.fields,
+            'documents': self.documents,
+            'total_length': self.total_length,
+        }
+
+    def loads(self, data):
+        if not data['fields'] == self.fields:
+            raise ValueError('indexed fields changed')
+        self.clear()
+        self.documents = data['documents']
+        self.total_length = data['total_length']
+
+    def save(self):
+        # the buckets are written between two updates of the meta file, so
+        # an interrupted save leaves an index that is rebuilt next time
+        commit, self.commit = self.commit, None
+        super().save()
+        try:
+            for number in self.dirty:
+                filename = os.path.join(
+                    self.path, '{:02x}.json'.format(number))
+                with open(filename + '.tmp', 'w') as f:
+                    json.dump(self.buckets[number], f)
+                os.rename(filename + '.tmp', filename)
+        except IOError:
+            shutil.rmtree(self.path, ignore_errors=True)
+            self.clear()
+            return
+        self.dirty = set()
+        self.commit = commit
+        super().save()
+
+    def search(self, commit, query):
+        # returns (score, pk) pairs of documents containing all terms
+        self.update(commit)
+        terms = set(tokenize(query))
+        if not terms or not self.documents:
+            return []
+        average_length = self.total_length / self.documents
+        scores = None
+        for term in terms:
+            postings = self.get_bucket(term).get(term, {})
+            idf = math.log(
+                1 + (self.documents - len(postings) + 0.5) /
+                (len(postings) + 0.5))
+            term_scores = {}
+            for pk, (count, length) in postings.items():
+                norm = 1 - self.B + self.B * length / average_length
+                term_scores[pk] = idf * count * (self.K1 + 1) / (
+                    count + self.K1 * norm)
+            if scores is None:
+                scores = term_scores
+            else:
+                scores = {
+                    pk: score + term_scores[pk]
+                    for pk, score in scores.items() if pk in term_scores}
+        pk_field = self.model._meta.pk
+        return sorted(
+            ((score, pk_field.loads(pk)) for pk, score in scores.items()),
+            key=lambda x: x[0], reverse=True)
+
+
+def get_search_index(model, fields):
+    return get_cached_index(SearchIndex, model, tuple(fields))
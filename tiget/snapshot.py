@@ -0,0 +1,78 @@
+from functools import wraps
+
+from git_orm import transaction, GitError
+
+from tiget.conf import settings
+
+
+__all__ = ['ReadOnlyError', 'Snapshot', 'snapshot']
+
+
+class ReadOnlyError(GitError): pass
+
+
+class Snapshot(transaction.Transaction):
+    # A transaction pinned to one commit that refuses all writes. There is
+    # nothing to commit or roll back, so the trees loaded into the memory
+    # tree stay valid for as long as the commit is the branch head and the
+    # snapshot is shared by all read-only commands until then.
+    def __init__(self, repo, commit):
+        super().__init__(repo, [] if commit is None else [commit])
+
+    @property
+    def commit_oid(self):
+        return self.parents[0] if self.parents else None
+
+    def _fail(self, *args, **kwargs):
+        raise ReadOnlyError('read-only snapshot, writes are not allowed')
+
+    set_blob = add_message = commit = _fail
+
+    def rollback(self):
+        pass
+
+
+_snapshot = None
+
+
+def _get_snapshot():
+    global _snapshot
+    repo = settings.core.repository
+    ref = 'refs/heads/{}'.format(settings.core.branch)
+    try:
+        commit = repo.lookup_reference(ref).target
+    except KeyError:
+        commit = None
+    if _snapshot is None or not _snapshot.repo is repo or \
+            not _snapshot.commit_oid == commit:
+        _snapshot = Snapshot(repo, commit)
+    return _snapshot
+
+
+class snapshot:
+    # Like transaction.wrap, but for code that only reads: a Snapshot of the
+    # branch head is installed as the running transaction. Inside of a
+    # running transaction that transaction is used, so uncommitted changes
+    # are visible. Unlike transaction.wrap, one instance may be used as
+    # decorator of reentrant functions.
+    def __call__(self, fn):
+        @wraps(fn)
+        def _inner(*args, **kwargs):
+            with snapshot():
+                return fn(*args, **kwargs)
+        return _inner
+
+    def __enter__(self):
+        try:
+            self.active = False
+            return transaction.current()
+        except GitError:
+            pass
+        self.active = True
+        # git_orm has no API to start a custom transaction
+        transaction._transaction = _get_snapshot()
+        return transaction._transaction
+
+    def __exit__(self, type, value, traceback):
+        if self.active:
+            transaction._transaction = None
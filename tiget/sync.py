@@ -0,0 +1,75 @@
+import time
+from subprocess import Popen, PIPE, TimeoutExpired
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+from tiget.conf import settings
+
+
+__all__ = ['SyncError', 'SyncResult', 'fetch', 'push', 'sync_remotes']
+
+
+class SyncError(Exception): pass
+
+
+# error is None if the transfer succeeded; duration is in seconds
+SyncResult = namedtuple('SyncResult', ['remote', 'error', 'duration'])
+
+
+def _git(args, timeout=None):
+    repo = settings.core.repository
+    cmd = ['git', '--git-dir', repo.path] + args
+    p = Popen(cmd, stdout=PIPE, stderr=PIPE)
+    try:
+        _, stderr = p.communicate(timeout=timeout)
+    except TimeoutExpired:
+        p.kill()
+        p.communicate()
+        raise SyncError('timed out after {} seconds'.format(timeout))
+    if p.returncode:
+        lines = [
+            line for line in stderr.decode('utf-8', 'replace').splitlines()
+            if line.strip() and not line.startswith('hint:')]
+        # the first error is the cause, later lines are advice
+        for line in lines:
+            if line.startswith(('fatal:', 'error:')):
+                raise SyncError(line)
+        if lines:
+            raise SyncError(lines[-1])
+        raise SyncError('git-{} returned with exit status {}'.format(
+            args[0], p.returncode))
+
+
+def fetch(remote, timeout=None):
+    # unlike git_orm.sync.fetch every remote gets its own tracking branch;
+    # FETCH_HEAD is not written, since fetches run concurrently
+    _git([
+        'fetch', '--no-write-fetch-head', remote,
+        'refs/heads/{0}:refs/remotes/{1}/{0}'.format(
+            settings.core.branch, remote),
+    ], timeout)
+
+
+def push(remote, timeout=None):
+    _git([
+        'push', remote,
+        'refs/heads/{0}:refs/heads/{0}'.format(settings.core.branch),
+    ], timeout)
+
+
+def sync_remotes(fn, remotes, timeout=None):
+    # Calls fn(remote, timeout) for all remotes concurrently and returns a
+    # SyncResult for each of them, in the order of remotes. The transfers
+    # are separate git processes, so they don't contend for the GIL.
+    def _sync(remote):
+        start = time.time()
+        error = None
+        try:
+            fn(remote, timeout)
+        except (SyncError, OSError) as e:
+            # OSError: git could not be started
+            error = str(e)
+        return SyncResult(remote, error, time.time() - start)
+
+    with ThreadPoolExecutor(max_workers=max(1, len(remotes))) as executor:
+        return list(executor.map(_sync, remotes))
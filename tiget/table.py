@@ -1,7 +1,11 @@
 import math
 from textwrap import wrap
+from itertools import chain, islice
 
 from tiget.utils import get_termsize
+from tiget.queryset import get_prefix_lengths
+from tiget.profiling import profile_iter
+from tiget.snapshot import snapshot
 
 CENTER = lambda x, width: x.center(width)
 LJUST = lambda x, width: x.ljust(width)
@@ -9,38 +13,58 @@ RJUST = lambda x, width: x.rjust(width)
 
 
 class Table:
+    # number of lazily added rows that are measured before rendering starts
+    SAMPLE_SIZE = 200
+
     def __init__(self, *args):
         self.columns = args
         self.rows = []
+        self.lazy_rows = iter(())
         self.col_width = [len(col) for col in args]
         self.styles = [LJUST] * len(args)
 
     @classmethod
     def from_queryset(cls, queryset, fields=None):
+        meta = queryset.model._meta
         if fields is None:
-            fields = queryset.model._meta.writable_fields
+            fields = meta.writable_fields
         else:
-            fields = [queryset.model._meta.get_field(f) for f in fields]
+            fields = [meta.get_field(f) for f in fields]
         table = cls(*(f.name for f in fields))
-        for instance in queryset:
-            values = []
-            for f in fields:
-                try:
-                    fn = getattr(instance, 'get_{}_display'.format(f.name))
-                except AttributeError:
-                    value = f.dumps(getattr(instance, f.attname))
-                else:
-                    value = fn()
-                values.append(value)
-            table.add_row(*values)
+        table.add_rows(cls._iter_queryset(queryset, fields))
         return table
 
-    def add_row(self, *args):
+    @staticmethod
+    def _iter_queryset(queryset, fields):
+        meta = queryset.model._meta
+        with snapshot():
+            prefix_lengths = {}
+            if meta.pk.hidden and meta.pk in fields:
+                prefix_lengths = get_prefix_lengths(queryset.model)
+            iterator = getattr(queryset, 'iterator', queryset.__iter__)
+            for instance in iterator():
+                values = []
+                for f in fields:
+                    try:
+                        fn = getattr(instance, 'get_{}_display'.format(f.name))
+                    except AttributeError:
+                        value = f.dumps(getattr(instance, f.attname))
+                    else:
+                        value = fn()
+                    if f is meta.pk and instance.pk in prefix_lengths:
+                        value = value[:prefix_lengths[instance.pk]]
+                    values.append(value)
+                yield values
+
+    def _clean_row(self, args):
         column_count = len(self.columns)
         if not len(args) == column_count:
             raise TypeError(
                 'expected exactly {} arguments'.format(column_count))
-        args = [str(x or '') for x in args]
+        return [str(x or '') for x in args]
+
+    def add_row(self, *args):
+        args = self._clean_row(args)
         self.rows.append(args)
         for i, col in enumerate(args):
             lines = col.splitlines()
@@ -50,16 +74,25 @@ class Table:
                 linelen = 0
             self.col_width[i] = max(linelen, self.col_width[i])
 
-    def render(self):
+    def add_rows(self, rows):
+        # rows are consumed while rendering; only a sample is measured
+        self.lazy_rows = chain(self.lazy_rows, rows)
+
+    def render_lines(self):
+        return profile_iter('render table', self._render_lines())
+
+    def _render_lines(self):
+        for row in islice(self.lazy_rows, self.SAMPLE_SIZE):
+            self.add_row(*row)
+
         unscaled = sum(self.col_width)
         sep_width = (len(self.col_width) - 1) * 3
         available_width = get_termsize().cols - sep_width - 4
-        ratio = min(1, available_width / unscaled)
+        ratio = min(1, available_width / max(1, unscaled))
         widths = [max(1, math.floor(w * ratio)) for w in self.col_width]
 
         def _render_row(row, header=False):
             cells = [wrap(value, width) for value, width in zip(row, widths)]
-            lines = []
             while any(cells):
                 values = []
                 for cell, width, style in zip(cells, widths, self.styles):
@@ -67,16 +100,21 @@ class Table:
                         style = CENTER
                     value = style(cell.pop(0) if cell else '', width)
                     values += [value]
-                line = '| {} |'.format(' | '.join(values))
-                lines.append(line)
-            return '\n'.join(lines) + '\n'
+                yield '| {} |\n'.format(' | '.join(values))
 
         separator = '+-' + '-+-'.join('-' * w for w in widths) + '-+\n'
 
-        s = separator
-        s += _render_row(self.columns, header=True)
-        s += separator
+        yield separator
+        for line in _render_row(self.columns, header=True):
+            yield line
+        yield separator
         for row in self.rows:
-            s += _render_row(row)
-        s += separator
-        return s
+            for line in _render_row(row):
+                yield line
+        for row in self.lazy_rows:
+            for line in _render_row(self._clean_row(row)):
+                yield line
+        yield separator
+
+    def render(self):
+        return ''.join(self.render_lines())
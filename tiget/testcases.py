@@ -5,4 +5,6 @@ class TigetTestCase(GitTestCase):
     def setup(self):
         super().setup()
         from tiget.conf import settings
+        from tiget.cache import get_object_cache
         settings.core.repository = self.repo.path
+        get_object_cache().clear()
@@ -0,0 +1,102 @@
+import sys
+from io import StringIO
+from tempfile import NamedTemporaryFile
+from types import ModuleType
+
+from nose.tools import *
+from mock import patch
+from git_orm import models, transaction, GitError
+
+from tiget.testcases import TigetTestCase
+from tiget.cmds import CmdError, cmd_execfile, get_command
+from tiget.plugins import load_plugin, unload_plugin
+from tiget.main import main
+
+
+class Issue(models.Model):
+    summary = models.TextField()
+    status = models.TextField(choices=('new', 'fixed'), default='new')
+
+
+class TestBatch(TigetTestCase):
+    def setup(self):
+        super().setup()
+        mod = ModuleType('tiget_issues')
+        mod.load = lambda plugin: plugin.add_model(Issue)
+        sys.modules[mod.__name__] = mod
+        load_plugin(mod.__name__)
+        with transaction.wrap('setup'):
+            self.issues = [
+                Issue.create(summary='issue {}'.format(i)) for i in range(4)]
+
+    def teardown(self):
+        unload_plugin('tiget_issues')
+        del sys.modules['tiget_issues']
+        super().teardown()
+
+    def execfile(self, lines, **kwargs):
+        f = StringIO('\n'.join(lines))
+        f.name = '<test>'
+        cmd_execfile(f, batch=True, **kwargs)
+
+    def fix(self, issue):
+        return 'edit issue {} status=fixed'.format(issue.pk)
+
+    def count_fixed(self):
+        return Issue.objects.filter(status='fixed').count()
+
+    def test_batch(self):
+        self.execfile(['# fix all'] + [self.fix(i) for i in self.issues])
+        self.assert_commit_count(2)
+        eq_(self.count_fixed(), 4)
+        assert_raises(GitError, transaction.current)
+
+    def test_checkpoint(self):
+        self.execfile([self.fix(i) for i in self.issues], checkpoint=2)
+        self.assert_commit_count(3)
+        eq_(self.count_fixed(), 4)
+
+    def test_rollback(self):
+        lines = [self.fix(self.issues[0]), 'edit issue 0000 status=fixed']
+        with assert_raises(CmdError) as cm:
+            self.execfile(lines)
+        ok_(str(cm.exception).startswith('"<test>", line 2: '))
+        self.assert_commit_count(1)
+        eq_(self.count_fixed(), 0)
+        assert_raises(GitError, transaction.current)
+
+    def test_ending_transaction(self):
+        assert_raises(
+            CmdError, self.execfile, [self.fix(self.issues[0]), 'rollback'])
+        self.assert_commit_count(1)
+        assert_raises(GitError, transaction.current)
+
+    def test_nothing_changed(self):
+        self.execfile(['list issue'])
+        self.assert_commit_count(1)
+
+    def test_source(self):
+        with NamedTemporaryFile('w', suffix='.tiget') as f:
+            f.write('\n'.join(self.fix(i) for i in self.issues))
+            f.flush()
+            get_command('source').run('--batch', f.name)
+        self.assert_commit_count(2)
+        eq_(self.count_fixed(), 4)
+
+    def test_source_checkpoint_without_batch(self):
+        with NamedTemporaryFile('w', suffix='.tiget') as f:
+            f.write(self.fix(self.issues[0]))
+            f.flush()
+            assert_raises(
+                CmdError, get_command('source').run, '--checkpoint', '2',
+                f.name)
+        self.assert_commit_count(1)
+
+
+@patch('sys.stderr', StringIO())
+def test_invalid_arguments():
+    for argv in (['--batch', 'list'], ['--checkpoint', '2']):
+        with patch.object(sys, 'argv', ['tiget'] + argv):
+            with assert_raises(SystemExit) as cm:
+                main()
+            eq_(cm.exception.code, 2)
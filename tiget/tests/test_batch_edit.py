@@ -0,0 +1,65 @@
+import sys
+from io import StringIO
+from types import ModuleType
+
+from nose.tools import *
+from mock import patch
+from git_orm import models, transaction
+
+from tiget.testcases import TigetTestCase
+from tiget.cmds import get_command, CmdError
+from tiget.plugins import load_plugin, unload_plugin
+
+
+class Issue(models.Model):
+    summary = models.TextField()
+    status = models.TextField(choices=('new', 'fixed'), default='new')
+
+
+class TestBatchEdit(TigetTestCase):
+    def setup(self):
+        super().setup()
+        mod = ModuleType('tiget_issues')
+        mod.load = lambda plugin: plugin.add_model(Issue)
+        sys.modules[mod.__name__] = mod
+        load_plugin(mod.__name__)
+        with transaction.wrap('setup'):
+            for i in range(5):
+                Issue.create(
+                    summary='issue {}'.format(i),
+                    status='fixed' if i == 4 else 'new')
+
+    def teardown(self):
+        unload_plugin('tiget_issues')
+        del sys.modules['tiget_issues']
+        super().teardown()
+
+    def batch_edit(self, *argv):
+        stdout = StringIO()
+        with patch('sys.stdout', stdout):
+            get_command('batch-edit').run(*argv)
+        return stdout.getvalue()
+
+    def test_batch_edit(self):
+        output = self.batch_edit('issue', 'status=new', '--', 'status=fixed')
+        eq_(output.splitlines()[0], 'editing 4 matching objects')
+        self.assert_commit_count(2)
+        eq_(Issue.objects.filter(status='fixed').count(), 5)
+
+    def test_dry_run(self):
+        output = self.batch_edit(
+            '-n', 'issue', 'status=new', '--', 'status=fixed')
+        eq_(output, '4 objects would be edited\n')
+        self.assert_commit_count(1)
+
+    def test_unchanged_objects_are_not_saved(self):
+        self.batch_edit('issue', 'status=fixed', '--', 'status=fixed')
+        self.assert_commit_count(1)
+
+    def test_errors(self):
+        batch_edit = self.batch_edit
+        assert_raises(CmdError, batch_edit, 'issue', 'status=new')
+        assert_raises(CmdError, batch_edit, 'issue', 'foo=bar', '--', 'x=y')
+        assert_raises(
+            CmdError, batch_edit, 'issue', 'status=new', '--', 'status=bad')
+        self.assert_commit_count(1)
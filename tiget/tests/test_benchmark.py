@@ -0,0 +1,40 @@
+import shutil
+import tempfile
+
+from nose.tools import *
+from git_orm import transaction
+
+from tiget.plugins import plugins, unload_plugin
+from tiget.benchmark import generate, compare
+
+
+class TestGenerate:
+    def setup(self):
+        self.path = tempfile.mkdtemp()
+        self.scrum_loaded = 'scrum' in plugins
+
+    def teardown(self):
+        if not self.scrum_loaded and 'scrum' in plugins:
+            unload_plugin('scrum')
+        shutil.rmtree(self.path)
+
+    def test_generate(self):
+        ticket = generate(self.path, 20)
+        from tiget.scrum.models import User, Ticket, Comment
+        with transaction.wrap():
+            eq_(Ticket.objects.count(), 20)
+            eq_(Comment.objects.count(), 20)
+            eq_(User.objects.count(), 5)
+            eq_(Ticket.objects.get(pk=ticket).owner_email, 'user0@example.org')
+
+
+def test_compare():
+    def results(**medians):
+        timings = {name: {'median': m} for name, m in medians.items()}
+        return {'results': {'10': timings}}
+    rows = list(compare(
+        results(list=1.0, stats=1.0), results(list=1.1, stats=1.5, mine=1)))
+    eq_(rows, [
+        ('10', 'list', 1.0, 1.1, False),
+        ('10', 'stats', 1.0, 1.5, True),
+    ])
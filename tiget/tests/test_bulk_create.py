@@ -0,0 +1,59 @@
+from nose.tools import *
+from git_orm import models, transaction
+
+from tiget.testcases import TigetTestCase
+from tiget.queryset import IndexedQuerySet
+
+
+class Author(models.Model):
+    name = models.TextField(primary_key=True)
+
+
+class Book(models.Model):
+    title = models.TextField()
+    author = models.ForeignKey(Author)
+
+
+Author.objects = IndexedQuerySet(Author)
+Book.objects = IndexedQuerySet(Book)
+
+
+class TestBulkCreate(TigetTestCase):
+    def test_bulk_create(self):
+        with transaction.wrap():
+            authors = [Author(name='alice'), Author(name='bob')]
+            eq_(Author.objects.bulk_create(authors), 2)
+            books = (
+                Book(title='book {}'.format(i), author=authors[i % 2])
+                for i in range(10))
+            eq_(Book.objects.bulk_create(books), 10)
+        self.assert_commit_count(1)
+        eq_(Book.objects.filter(author_name='bob').count(), 5)
+
+    def test_invalid_foreign_key(self):
+        books = [Book(title='orphan', author='nobody')]
+        assert_raises(Book.InvalidObject, Book.objects.bulk_create, books)
+        self.assert_commit_count(0)
+
+    def test_invalid_type(self):
+        assert_raises(TypeError, Book.objects.bulk_create, [Author()])
+
+    def test_bulk_update(self):
+        with transaction.wrap('setup'):
+            Author.objects.bulk_create([Author(name='alice')])
+            Book.objects.bulk_create(
+                Book(title='book {}'.format(i), author='alice')
+                for i in range(3))
+        books = list(Book.objects.all())
+        for book in books:
+            book.title = 'renamed'
+        eq_(Book.objects.bulk_update(books), 3)
+        self.assert_commit_count(2)
+        eq_(Book.objects.filter(title='renamed').count(), 3)
+
+    def test_bulk_import(self):
+        Author.objects.bulk_create([Author(name='alice')])
+        authors = [Author(name='alice'), Author(name='bob')]
+        eq_(Author.objects.bulk_import(authors), 2)
+        self.assert_commit_count(2)
+        eq_(Author.objects.count(), 2)
@@ -0,0 +1,151 @@
+import os
+import marshal
+
+from nose.tools import *
+from git_orm import models, transaction
+
+from tiget.testcases import TigetTestCase
+from tiget.conf import settings
+from tiget.git import get_head, get_blob_oid
+from tiget.queryset import IndexedQuerySet
+from tiget.snapshot import snapshot
+from tiget.iostats import track_io
+from tiget.cache import (
+    LRUCache, ObjectStore, get_object_cache, get_object_store,
+    flush_object_stores)
+
+
+class Page(models.Model):
+    title = models.TextField()
+
+
+Page.objects = IndexedQuerySet(Page)
+
+
+def test_lru_cache():
+    cache = LRUCache(2)
+    cache.put('a', 1)
+    cache.put('b', 2)
+    eq_(cache.get('a'), 1)
+    cache.put('c', 3)
+    ok_(not 'b' in cache)
+    eq_(cache.get('b'), None)
+    eq_((cache.hits, cache.misses), (1, 1))
+    eq_(cache.hit_rate, 0.5)
+    cache.resize(1)
+    eq_(list(cache.entries), ['c'])
+    cache.resize(0)
+    cache.put('d', 4)
+    eq_(len(cache), 0)
+
+
+class TestObjectCache(TigetTestCase):
+    def setup(self):
+        super().setup()
+        self.page = Page.create(title='foo')
+
+    def test_cached(self):
+        with track_io('get') as stats:
+            eq_(Page.objects.get(pk=self.page.pk).title, 'foo')
+        eq_(stats.blobs_read, 1)
+        with track_io('get') as stats:
+            eq_(Page.objects.get(pk=self.page.pk).title, 'foo')
+        eq_((stats.blobs_read, stats.cache_hits), (0, 1))
+        self.page.title = 'bar'
+        self.page.save()
+        eq_(Page.objects.get(pk=self.page.pk).title, 'bar')
+        eq_(len(get_object_cache()), 2)
+
+    def test_pending(self):
+        with transaction.wrap():
+            self.page.title = 'bar'
+            self.page.save()
+            eq_(Page.objects.get(pk=self.page.pk).title, 'bar')
+        eq_(len(get_object_cache()), 0)
+
+    def test_size_setting(self):
+        settings.core.cache_size = 0
+        try:
+            Page.objects.get(pk=self.page.pk)
+            eq_(len(get_object_cache()), 0)
+        finally:
+            settings.core.cache_size = 10000
+
+
+class TestObjectStore(TigetTestCase):
+    def setup(self):
+        super().setup()
+        self.pages = [Page.create(title=str(i)) for i in range(3)]
+
+    def test_load(self):
+        page = self.pages[0]
+        with snapshot() as trans:
+            oid = get_blob_oid(trans, page.path)
+        store = ObjectStore(Page)
+        with track_io('get') as stats:
+            eq_(store.get(get_head(), page.pk, oid), None)
+        eq_(stats.blobs_read, 0)
+        store.put(get_head(), page.pk, oid, {'title': '0'})
+        store.flush()
+        store = ObjectStore(Page)
+        store.load()
+        eq_(store.commit, get_head())
+        eq_(store.get(get_head(), page.pk, oid), {'title': '0'})
+
+    def test_filled_on_load(self):
+        Page.objects.get(pk=self.pages[0].pk)
+        flush_object_stores()
+        store = ObjectStore(Page)
+        store.load()
+        eq_(list(store.entries), [self.pages[0].pk])
+
+    def test_incremental_update(self):
+        list(Page.objects.all())
+        flush_object_stores()
+        page = self.pages[1]
+        page.title = 'foo'
+        page.save()
+        store = ObjectStore(Page)
+        with track_io('update') as stats:
+            store.update(get_head())
+        eq_((stats.blobs_read, stats.paths), (0, {}))
+        ok_(not page.pk in store.entries)
+        eq_(len(store.entries), 2)
+
+    def test_batched_saves(self):
+        store = get_object_store(Page)
+        store.update(get_head())
+        ok_(store.dirty)
+        ok_(not os.path.exists(store.filename))
+        flush_object_stores()
+        ok_(not store.dirty)
+        ok_(os.path.exists(store.filename))
+
+    def test_corrupt(self):
+        store = ObjectStore(Page)
+        store.update(get_head())
+        store.flush()
+        with open(store.filename, 'wb') as f:
+            f.write(b'\x00garbage')
+        store = ObjectStore(Page)
+        store.load()
+        eq_(store.commit, None)
+
+    def test_wrong_shape(self):
+        store = ObjectStore(Page)
+        data = {'version': ObjectStore.VERSION, 'commit': get_head(),
+                'data': [1, 2]}
+        with open(store.filename, 'wb') as f:
+            f.write(marshal.dumps(data))
+        store.load()
+        eq_(store.commit, None)
+
+    def test_queryset(self):
+        eq_(Page.objects.count(), 3)
+        list(Page.objects.all())
+        get_object_cache().clear()
+        with track_io('list') as stats:
+            eq_(sorted(page.title for page in Page.objects.all()),
+                ['0', '1', '2'])
+        eq_(stats.blobs_read, 0)
+        eq_(stats.cache_hits, 3)
@@ -0,0 +1,83 @@
+import sys
+from types import ModuleType
+
+from nose.tools import *
+from git_orm import models, transaction
+
+from tiget.testcases import TigetTestCase
+from tiget.cmds import Cmd, get_command
+from tiget.git import get_head
+from tiget.changes import track
+from tiget.index import get_index
+from tiget.plugins import load_plugin, unload_plugin
+
+
+class Entry(models.Model):
+    text = models.TextField()
+    state = models.TextField(choices=('open', 'done'), default='open')
+
+
+class AddEntry(Cmd):
+    def setup(self):
+        self.parser.add_argument('text', nargs='+')
+
+    @transaction.wrap()
+    def do(self, args):
+        for text in args.text:
+            Entry.create(text=text)
+
+
+class TestChangeFeed(TigetTestCase):
+    def setup(self):
+        super().setup()
+        self.changesets = []
+        mod = ModuleType('tiget_entries')
+
+        def load(plugin):
+            plugin.add_model(Entry)
+            plugin.add_cmd(AddEntry)
+            plugin.add_change_subscriber(self.changesets.append)
+        mod.load = load
+        sys.modules[mod.__name__] = mod
+        load_plugin(mod.__name__)
+
+    def teardown(self):
+        unload_plugin('tiget_entries')
+        del sys.modules['tiget_entries']
+        super().teardown()
+
+    def test_commit_is_published(self):
+        get_command('add-entry').run('foo', 'bar')
+        eq_(len(self.changesets), 1)
+        changeset = self.changesets[0]
+        eq_(changeset.new_commit, get_head())
+        eq_(len(changeset.added), 2)
+        eq_(changeset.modified | changeset.deleted, set())
+        storage_name = Entry._meta.storage_name
+        ok_(all(path[0] == storage_name for path in changeset.added))
+
+    def test_nested_commands_are_published_once(self):
+        with track():
+            get_command('add-entry').run('foo')
+            get_command('add-entry').run('bar')
+        eq_(len(self.changesets), 1)
+        eq_(len(self.changesets[0]), 2)
+
+    def test_indexes_follow_the_branch(self):
+        get_command('add-entry').run('foo')
+        index = get_index(Entry)
+        eq_(Entry.objects.filter(state='open').count(), 1)
+
+        def rebuild(commit):
+            raise AssertionError('index was rebuilt')
+        index.rebuild = rebuild
+        try:
+            get_command('add-entry').run('bar')
+            eq_(index.commit, get_head())
+            with transaction.wrap():
+                entry = Entry.objects.get(text='foo')
+                entry.state = 'done'
+                entry.save()
+            eq_(Entry.objects.filter(state='open').count(), 1)
+        finally:
+            del index.rebuild
@@ -0,0 +1,48 @@
+import sys
+from types import ModuleType
+
+from nose.tools import *
+
+from tiget.cmds import Cmd, get_command
+from tiget.plugins import load_plugin, unload_plugin, plugins
+
+
+class Frobnicate(Cmd):
+    description = 'frobnicate'
+    setup_calls = 0
+
+    def setup(self):
+        self.__class__.setup_calls += 1
+        self.parser.add_argument('value')
+
+    def do(self, args):
+        self.value = args.value
+
+
+class TestCmdRegistry:
+    def setup(self):
+        Frobnicate.setup_calls = 0
+        mod = ModuleType('tiget_frobnicate')
+        mod.load = lambda plugin: plugin.add_cmd(Frobnicate)
+        sys.modules[mod.__name__] = mod
+        load_plugin(mod.__name__)
+
+    def teardown(self):
+        if 'tiget_frobnicate' in plugins:
+            unload_plugin('tiget_frobnicate')
+        del sys.modules['tiget_frobnicate']
+
+    def test_parser_is_built_on_first_use(self):
+        cmd = get_command('frobnicate')
+        eq_(Frobnicate.setup_calls, 0)
+        cmd.run('foo')
+        cmd.run('bar')
+        eq_(Frobnicate.setup_calls, 1)
+        eq_(cmd.value, 'bar')
+
+    def test_core_commands_are_merged(self):
+        eq_(get_command('help').name, 'help')
+
+    def test_unload_removes_commands(self):
+        unload_plugin('tiget_frobnicate')
+        assert_raises(KeyError, get_command, 'frobnicate')
@@ -0,0 +1,183 @@
+import os
+import sys
+import json
+import time
+import shutil
+import signal
+import tempfile
+import subprocess
+from io import BytesIO
+
+from types import ModuleType
+
+from nose.tools import *
+from git_orm import models, transaction, GitError
+
+from tiget.testcases import TigetTestCase
+from tiget.cmds import Cmd
+from tiget.changes import track
+from tiget.iostats import track_io
+from tiget.plugins import plugins, load_plugin, unload_plugin
+from tiget.benchmark import generate
+from tiget.daemon import Server, DetachedStdin, forward, find_socket_path
+
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..'))
+
+
+class Entry(models.Model):
+    text = models.TextField()
+
+
+class AddEntry(Cmd):
+    def setup(self):
+        self.parser.add_argument('text')
+
+    @transaction.wrap()
+    def do(self, args):
+        Entry.create(text=args.text)
+
+
+class TestServer(TigetTestCase):
+    def setup(self):
+        super().setup()
+        self.path = os.path.join(self.repo.path, 'tiget.sock')
+        self.server = Server(self.path)
+
+    def teardown(self):
+        self.server.server_close()
+        super().teardown()
+
+    def execute(self, *argv):
+        f = BytesIO()
+        status = self.server.execute(list(argv), os.getcwd(), f)
+        messages = [json.loads(line.decode('utf-8')) for line in
+                    f.getvalue().splitlines()]
+        return status, messages
+
+    def test_output(self):
+        status, messages = self.execute('echo', 'foo')
+        eq_(status, 0)
+        eq_(''.join(m['stdout'] for m in messages), 'foo\n')
+
+    def test_error(self):
+        status, messages = self.execute('frobnicate')
+        eq_(status, 1)
+        ok_('command not found' in messages[0]['stderr'])
+
+    def test_transaction_does_not_leak(self):
+        status, messages = self.execute('begin')
+        eq_(status, 1)
+        assert_raises(GitError, transaction.current)
+
+    def test_stdin(self):
+        stdin = DetachedStdin()
+        assert_raises(IOError, stdin.read)
+        assert_raises(IOError, list, stdin)
+
+    def test_needs_terminal(self):
+        eq_(self.execute('edit-config'), (None, []))
+        eq_(self.execute('time', 'edit-config'), (None, []))
+
+    def stdout(self, messages):
+        return ''.join(m.get('stdout', '') for m in messages)
+
+    def test_perf_per_request(self):
+        # the requests are executed while serve is running
+        with track_io('serve'):
+            self.execute('echo', 'foo')
+            status, messages = self.execute('perf')
+            ok_('last command: echo foo\n' in self.stdout(messages))
+            status, messages = self.execute('perf')
+            ok_('last command: perf\n' in self.stdout(messages))
+
+    def test_changes_per_request(self):
+        changesets = []
+        mod = ModuleType('tiget_entries')
+
+        def load(plugin):
+            plugin.add_model(Entry)
+            plugin.add_cmd(AddEntry)
+            plugin.add_change_subscriber(changesets.append)
+        mod.load = load
+        sys.modules[mod.__name__] = mod
+        load_plugin(mod.__name__)
+        try:
+            with track():
+                eq_(self.execute('add-entry', 'foo')[0], 0)
+                eq_(len(changesets), 1)
+                eq_(self.execute('add-entry', 'bar')[0], 0)
+                eq_(len(changesets), 2)
+        finally:
+            unload_plugin('tiget_entries')
+            del sys.modules['tiget_entries']
+
+    def test_forward(self):
+        ok_(os.path.exists(self.path))
+        self.server.server_close()
+        ok_(not os.path.exists(self.path))
+        eq_(forward(self.path, ['echo']), None)
+
+
+class TestForwarding:
+    # drives the forwarding of tiget.main with a daemon in another process
+    def setup(self):
+        self.path = tempfile.mkdtemp()
+        self.scrum_loaded = 'scrum' in plugins
+        generate(self.path, 3)
+        # keep ~/.tigetrc out and use this tiget, even if it isn't installed
+        self.env = dict(os.environ, HOME=self.path, PAGER='cat')
+        self.env['PYTHONPATH'] = os.pathsep.join(
+            filter(None, [ROOT, os.environ.get('PYTHONPATH')]))
+        self.daemon = subprocess.Popen(
+            self.argv('serve'), cwd=self.path, env=self.env,
+            stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL,
+            stderr=subprocess.DEVNULL)
+        socket_path = find_socket_path(self.path)
+        for i in range(100):
+            if os.path.exists(socket_path):
+                break
+            time.sleep(0.1)
+        else:
+            raise AssertionError('daemon did not start')
+
+    def teardown(self):
+        self.daemon.send_signal(signal.SIGINT)
+        self.daemon.wait()
+        if not self.scrum_loaded and 'scrum' in plugins:
+            unload_plugin('scrum')
+        shutil.rmtree(self.path)
+
+    def argv(self, *argv):
+        return [
+            sys.executable, '-c', 'from tiget.main import main; main()',
+        ] + list(argv)
+
+    def tiget(self, *argv, input=''):
+        p = subprocess.Popen(
+            self.argv(*argv), cwd=self.path, env=self.env,
+            stdin=subprocess.PIPE, stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE)
+        stdout, stderr = p.communicate(input.encode('utf-8'), timeout=60)
+        return p.returncode, stdout.decode('utf-8')
+
+    def test_forwarded(self):
+        eq_(self.tiget('alias', 'greet=echo hello'), (0, ''))
+        # the alias is only known to the daemon
+        eq_(self.tiget('greet'), (0, 'hello\n'))
+        eq_(self.tiget('--no-daemon', 'greet')[0], 1)
+
+    def test_stdin_is_read_locally(self):
+        row = json.dumps({'summary': 'imported'}) + '\n'
+        eq_(self.tiget('import', 'ticket', input=row),
+            (0, 'imported 1 objects\n'))
+        status, output = self.tiget('stats')
+        eq_(status, 0)
+        ok_('| ticket  | scrum  | 4     |' in output)
+
+    def test_perf(self):
+        eq_(self.tiget('echo', 'foo'), (0, 'foo\n'))
+        status, output = self.tiget('perf')
+        ok_('last command: echo foo\n' in output)
+        status, output = self.tiget('perf')
+        ok_('last command: perf\n' in output)
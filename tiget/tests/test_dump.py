@@ -0,0 +1,100 @@
+import os
+import sys
+import shutil
+from io import StringIO
+from tempfile import mkdtemp
+from types import ModuleType
+
+from nose.tools import *
+from mock import patch
+from git_orm import models, transaction
+
+from tiget.testcases import TigetTestCase
+from tiget.queryset import IndexedQuerySet
+from tiget.cmds import get_command
+from tiget.plugins import load_plugin, unload_plugin
+from tiget.dump import FORMATS, dump_rows, load_rows
+
+
+class Note(models.Model):
+    text = models.TextField()
+    tag = models.TextField(null=True)
+
+
+Note.objects = IndexedQuerySet(Note)
+
+
+class TestDump(TigetTestCase):
+    def setup(self):
+        super().setup()
+        with transaction.wrap('setup'):
+            Note.create(text='first', tag='a')
+            Note.create(text='second')
+
+    def roundtrip(self, fmt):
+        f = StringIO()
+        with transaction.wrap():
+            count = FORMATS[fmt].write(
+                f, ['id', 'text', 'tag'], dump_rows(Note))
+        eq_(count, 2)
+        f.seek(0)
+        rows = list(FORMATS[fmt].read(f))
+        eq_(sorted((row['text'], row['tag']) for row in rows),
+            [('first', 'a'), ('second', None)])
+        with transaction.wrap():
+            Note.objects.bulk_create(load_rows(Note, rows))
+        eq_(Note.objects.count(), 2)
+        self.assert_commit_count(2)
+
+    def test_jsonl(self):
+        self.roundtrip('jsonl')
+
+    def test_csv(self):
+        self.roundtrip('csv')
+
+    def test_pending_changes(self):
+        with transaction.wrap():
+            Note.create(text='third')
+            eq_(len(list(dump_rows(Note))), 3)
+
+    def test_invalid_row(self):
+        rows = load_rows(Note, [{'text': 'ok'}, {'nonsense': 'x'}])
+        with assert_raises(Note.InvalidObject) as cm:
+            list(rows)
+        assert_in('row 2', str(cm.exception))
+
+
+class TestCommands(TigetTestCase):
+    def setup(self):
+        super().setup()
+        mod = ModuleType('tiget_notes')
+        mod.load = lambda plugin: plugin.add_model(Note)
+        sys.modules[mod.__name__] = mod
+        load_plugin(mod.__name__)
+        self.tmpdir = mkdtemp()
+        self.filename = os.path.join(self.tmpdir, 'notes.csv')
+        with transaction.wrap('setup'):
+            self.note = Note.create(text='first')
+
+    def teardown(self):
+        shutil.rmtree(self.tmpdir)
+        unload_plugin('tiget_notes')
+        del sys.modules['tiget_notes']
+        super().teardown()
+
+    def test_export_and_import(self):
+        get_command('export').run('note', '-f', 'csv', '-o', self.filename)
+        self.note.text = 'changed'
+        self.note.save()
+        with patch('sys.stdout', StringIO()):
+            get_command('import').run('note', '-f', 'csv', '-i', self.filename)
+        eq_(Note.objects.get(pk=self.note.pk).text, 'first')
+        commit = self.repo.lookup_reference(self.branchref).target
+        message = self.repo[commit].message
+        ok_('Import 1 notes (0 created, 1 updated)' in message)
+
+    def test_export_to_stdout(self):
+        stdout = StringIO()
+        with patch('sys.stdout', stdout):
+            get_command('export').run('note')
+        eq_(stdout.getvalue().count('"first"'), 1)
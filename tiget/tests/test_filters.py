@@ -0,0 +1,69 @@
+from nose.tools import *
+from git_orm import models, transaction
+
+from tiget.testcases import TigetTestCase
+from tiget.queryset import IndexedQuerySet
+from tiget.filters import FilterError, compile_filters
+
+
+class Member(models.Model):
+    name = models.TextField(primary_key=True)
+
+    @classmethod
+    def current(cls):
+        return cls.objects.get(name='alice')
+
+
+class Bug(models.Model):
+    summary = models.TextField()
+    notes = models.TextField(null=True)
+    status = models.TextField(choices=('new', 'wtf', 'fixed'), default='new')
+    owner = models.ForeignKey(Member, null=True)
+
+
+Member.objects = IndexedQuerySet(Member)
+Bug.objects = IndexedQuerySet(Bug)
+
+
+class TestFilters(TigetTestCase):
+    def setup(self):
+        super().setup()
+        with transaction.wrap('setup'):
+            alice = Member.create(name='alice')
+            bob = Member.create(name='bob')
+            Bug.create(summary='crash on start', status='new', owner=alice)
+            Bug.create(summary='typo', status='wtf', owner=bob)
+            Bug.create(summary='Crash on exit', status='fixed', notes='x')
+            Bug.create(summary='slow', status='new')
+
+    def where(self, *expressions):
+        objs = Bug.objects.filter(compile_filters(Bug, expressions))
+        with transaction.wrap():
+            summaries = sorted(bug.summary for bug in objs.iterator())
+            self.plan = objs.plan
+        return summaries
+
+    def test_values(self):
+        eq_(self.where('status=new,wtf'), ['crash on start', 'slow', 'typo'])
+        ok_(self.plan.indexed)
+        eq_(self.where('status!=new'), ['Crash on exit', 'typo'])
+
+    def test_current_and_null(self):
+        eq_(self.where('owner=me'), ['crash on start'])
+        eq_(self.where('owner=null'), ['Crash on exit', 'slow'])
+        ok_(self.plan.indexed)
+        eq_(self.where('owner!=null'), ['crash on start', 'typo'])
+
+    def test_contains(self):
+        eq_(self.where('summary~=CRASH', 'status=new'), ['crash on start'])
+        eq_(self.where('notes~=x'), ['Crash on exit'])
+        eq_(self.where('summary~=crash'), ['Crash on exit', 'crash on start'])
+        ok_(not self.plan.indexed)
+        # the earlier queries loaded every object already
+        eq_(self.plan.obj_cache.blobs_read, 0)
+        eq_(self.plan.obj_cache.cache_hits, 4)
+        ok_('cache hits: 4' in str(self.plan))
+
+    def test_errors(self):
+        for expression in ('status', 'foo=bar', 'status=bad', 'summary=null'):
+            assert_raises(FilterError, compile_filters, Bug, [expression])
@@ -0,0 +1,66 @@
+from nose.tools import *
+from mock import patch
+from git_orm import models, transaction
+
+from tiget.testcases import TigetTestCase
+from tiget.conf import settings
+from tiget.changes import get_branch_ref
+from tiget.git import get_head
+from tiget.history import HistoryMap
+
+
+class Page(models.Model):
+    title = models.TextField()
+
+
+class TestHistoryMap(TigetTestCase):
+    def setup(self):
+        super().setup()
+        self.page = Page.create(title='foo')
+        self.other = Page.create(title='bar')
+        self.page.title = 'baz'
+        self.page.save()
+
+    def lookup(self, history, instance):
+        entries = history.lookup(get_head(), instance.path)
+        return [entry.change for entry in entries]
+
+    def test_lookup(self):
+        history = HistoryMap()
+        eq_(self.lookup(history, self.page), ['modified', 'added'])
+        eq_(self.lookup(history, self.other), ['added'])
+
+    def test_incremental_update(self):
+        history = HistoryMap()
+        history.CHECKPOINT = 1
+        self.lookup(history, self.page)
+        with transaction.wrap('edit'):
+            self.page.title = 'qux'
+            self.page.save()
+            self.other.title = 'qux'
+            self.other.save()
+        history = HistoryMap()
+        eq_(self.lookup(history, self.page), ['modified', 'modified', 'added'])
+        eq_(self.lookup(history, self.other), ['modified', 'added'])
+        # the commits are only added once
+        eq_(history.lookup(get_head(), self.other.path)[0].commit, get_head())
+
+    def test_rewritten_branch(self):
+        history = HistoryMap()
+        base = get_head()
+        self.page.title = 'qux'
+        self.page.save()
+        eq_(self.lookup(history, self.page), ['modified', 'modified', 'added'])
+        settings.core.repository.create_reference(
+            get_branch_ref(), base, force=True)
+        self.other.title = 'qux'
+        self.other.save()
+        history = HistoryMap()
+        eq_(self.lookup(history, self.page), ['modified', 'added'])
+        eq_(self.lookup(history, self.other), ['modified', 'added'])
+
+    def test_not_writable(self):
+        with patch.object(HistoryMap, 'append', side_effect=IOError):
+            history = HistoryMap()
+            eq_(self.lookup(history, self.page), ['modified', 'added'])
+            eq_(self.lookup(history, self.other), ['added'])
@@ -0,0 +1,174 @@
+import os
+import json
+
+from nose.tools import *
+from git_orm import models, transaction
+
+from tiget.testcases import TigetTestCase
+from tiget.changes import get_changes
+from tiget.index import get_index, get_pk_index, get_count_index
+from tiget.queryset import (
+    IndexedQuerySet, get_prefix_lengths, count_objects, get_referrers)
+
+
+class Owner(models.Model):
+    name = models.TextField(primary_key=True)
+
+
+class Task(models.Model):
+    summary = models.TextField()
+    status = models.TextField(choices=('open', 'closed'), default='open')
+    owner = models.ForeignKey(Owner, null=True)
+
+
+Owner.objects = IndexedQuerySet(Owner)
+Task.objects = IndexedQuerySet(Task)
+
+
+class TestFieldIndex(TigetTestCase):
+    def setup(self):
+        super().setup()
+        with transaction.wrap('setup'):
+            self.alice = Owner.create(name='alice')
+            self.bob = Owner.create(name='bob')
+            for i in range(6):
+                Task.create(
+                    summary='task {}'.format(i),
+                    status='closed' if i % 2 else 'open',
+                    owner=self.alice if i < 4 else self.bob)
+
+    def summaries(self, queryset):
+        return sorted(task.summary for task in queryset)
+
+    def test_indexed_fields(self):
+        eq_(get_index(Task).fields, ['status', 'owner'])
+
+    def test_exact(self):
+        eq_(self.summaries(Task.objects.filter(status='open')),
+            ['task 0', 'task 2', 'task 4'])
+
+    def test_in_and_foreign_key(self):
+        tasks = Task.objects.filter(owner=self.bob, status__in=('open',))
+        with transaction.wrap():
+            eq_(self.summaries(tasks.iterator()), ['task 4'])
+            ok_(tasks.plan.indexed)
+        tasks = Task.objects.filter(owner_name='bob', status__in=('open',))
+        eq_(self.summaries(tasks), ['task 4'])
+
+    def test_union(self):
+        tasks = (
+            Task.objects.filter(owner=self.bob) |
+            Task.objects.filter(summary='task 0'))
+        eq_(self.summaries(tasks), ['task 0', 'task 4', 'task 5'])
+        tasks = (
+            Task.objects.filter(owner_name='bob') |
+            Task.objects.filter(summary='task 0'))
+        eq_(self.summaries(tasks), ['task 0', 'task 4', 'task 5'])
+        tasks = (
+            Task.objects.filter(owner__in=[self.bob]) |
+            Task.objects.filter(summary='task 0'))
+        eq_(self.summaries(tasks), ['task 0', 'task 4', 'task 5'])
+
+    def test_index_is_tagged_with_commit(self):
+        list(Task.objects.filter(status='open'))
+        index = get_index(Task)
+        ok_(os.path.exists(index.filename))
+        with open(index.filename) as f:
+            data = json.load(f)
+        commit = self.repo.lookup_reference(self.branchref).target
+        eq_(data['commit'], commit.hex)
+
+    def test_stale_index_is_rebuilt(self):
+        eq_(Task.objects.filter(status='closed').count(), 3)
+        Task.create(summary='task 6', status='closed')
+        eq_(Task.objects.filter(status='closed').count(), 4)
+
+    def test_referrers(self):
+        (model, field, tasks), = get_referrers(self.bob, [Owner, Task])
+        eq_((model, field.name), (Task, 'owner'))
+        with transaction.wrap():
+            eq_(self.summaries(tasks.iterator()), ['task 4', 'task 5'])
+            ok_(tasks.plan.indexed)
+            eq_(tasks.plan.obj_cache.blobs_read, 2)
+
+    def test_pending_changes(self):
+        with transaction.wrap():
+            task = Task.objects.get(summary='task 0')
+            task.status = 'closed'
+            task.save()
+            eq_(self.summaries(Task.objects.filter(status='closed')),
+                ['task 0', 'task 1', 'task 3', 'task 5'])
+
+
+class TestPkIndex(TigetTestCase):
+    def setup(self):
+        super().setup()
+        with transaction.wrap('setup'):
+            for name in ('alice', 'alfred', 'bob'):
+                Owner.create(name=name)
+
+    def test_startswith(self):
+        eq_(Owner.objects.get(pk__startswith='b').name, 'bob')
+        assert_raises(
+            Owner.MultipleObjectsReturned, Owner.objects.get,
+            name__startswith='al')
+        assert_raises(
+            Owner.DoesNotExist, Owner.objects.get, pk__startswith='c')
+        eq_(get_pk_index(Owner).keys, ['alfred', 'alice', 'bob'])
+
+    def test_exact_pk_does_not_exist(self):
+        ok_(Owner.objects.exists(pk='bob'))
+        ok_(not Owner.objects.exists(pk='carol'))
+
+    def test_pending_objects(self):
+        with transaction.wrap():
+            Owner.create(name='carol')
+            eq_(Owner.objects.get(pk__startswith='c').name, 'carol')
+
+    def test_prefix_lengths(self):
+        with transaction.wrap():
+            eq_(get_prefix_lengths(Owner),
+                {'alfred': 3, 'alice': 3, 'bob': 1})
+
+
+class TestCountIndex(TigetTestCase):
+    def setup(self):
+        super().setup()
+        with transaction.wrap('setup'):
+            for name in ('alice', 'bob'):
+                Owner.create(name=name)
+
+    def get_commit(self):
+        return self.repo.lookup_reference(self.branchref).target.hex
+
+    def test_count(self):
+        with transaction.wrap():
+            eq_(count_objects(Owner), 2)
+            Owner.create(name='carol')
+            Owner.objects.get(name='alice').save()
+            eq_(count_objects(Owner), 3)
+        eq_(get_count_index(Owner).count, 2)
+
+    def test_diff(self):
+        old_commit = self.get_commit()
+        Owner.create(name='carol')
+        changeset = get_changes(old_commit, self.get_commit())
+        path = (Owner._meta.storage_name, 'carol')
+        eq_(changeset.added, {path})
+        eq_(changeset.modified | changeset.deleted, set())
+        eq_(list(changeset.iter_objects(path[0]))[0][0], 'carol')
+
+    def test_incremental_update(self):
+        index = get_count_index(Owner)
+        eq_(index.get_count(self.get_commit()), 2)
+
+        def rebuild(commit):
+            raise AssertionError('index was rebuilt')
+        index.rebuild = rebuild
+        try:
+            Owner.create(name='carol')
+            eq_(index.get_count(self.get_commit()), 3)
+        finally:
+            del index.rebuild
+        with open(index.filename) as f:
+            eq_(json.load(f)['data'], 3)
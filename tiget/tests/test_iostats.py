@@ -0,0 +1,59 @@
+from nose.tools import *
+import git_orm
+from git_orm import models, transaction
+
+from tiget.testcases import TigetTestCase
+from tiget.conf import settings
+from tiget.git import get_head, iter_blobs
+from tiget.queryset import IndexedQuerySet
+from tiget.iostats import (
+    CountingRepository, format_size, get_stats, get_last_stats,
+    get_session_stats, track_io)
+
+
+class Page(models.Model):
+    title = models.TextField()
+
+
+Page.objects = IndexedQuerySet(Page)
+
+
+class TestIOStats(TigetTestCase):
+    def test_counting(self):
+        ok_(isinstance(settings.core.repository, CountingRepository))
+        with track_io('create') as stats:
+            page = Page.create(title='foo')
+        eq_(stats.blobs_written, 1)
+        eq_(stats.commits_written, 1)
+        ok_(stats.trees_written >= 2)
+        ok_(get_last_stats() is stats)
+        with track_io('get') as stats:
+            with track_io('nested') as nested:
+                ok_(nested is stats)
+                with transaction.wrap():
+                    Page.objects.get(pk=page.pk)
+        eq_(stats.name, 'get')
+        eq_(stats.blobs_read, 1)
+        eq_(stats.bytes_decoded, stats.bytes_read)
+        eq_(stats.paths, {'pages/' + page.pk: 1})
+        ok_(not get_stats() is stats)
+        ok_(get_session_stats().blobs_written >= 1)
+
+    def test_set_repository(self):
+        git_orm.set_repository(self.repo.path)
+        with track_io('create') as stats:
+            Page.create(title='foo')
+        eq_(stats.blobs_written, 1)
+        ok_(isinstance(git_orm.get_repository(), CountingRepository))
+
+    def test_iter_blobs(self):
+        Page.create(title='foo')
+        with track_io('iter') as stats:
+            eq_(len(list(iter_blobs(get_head(), ['pages']))), 1)
+        eq_((stats.blobs_read, stats.bytes_decoded), (1, 0))
+
+
+def test_format_size():
+    eq_(format_size(12), '12 B')
+    eq_(format_size(2048), '2.0 kB')
+    eq_(format_size(3 * 1024 ** 3), '3.0 GB')
@@ -0,0 +1,47 @@
+import os
+import shutil
+from tempfile import mkdtemp
+
+from nose.tools import *
+from mock import patch
+
+from tiget.plugins import manifest
+
+
+ENTRY_POINTS = [['core', 'tiget.core', []], ['date', 'datetime', ['date']]]
+
+
+class TestManifest:
+    def setup(self):
+        self.cache_home = mkdtemp()
+        self.environ = patch.dict(os.environ, XDG_CACHE_HOME=self.cache_home)
+        self.environ.start()
+        manifest.invalidate()
+
+    def teardown(self):
+        manifest.invalidate()
+        self.environ.stop()
+        shutil.rmtree(self.cache_home)
+
+    @patch('tiget.plugins.manifest._scan', return_value=ENTRY_POINTS)
+    def test_scan_is_cached(self, scan):
+        names = [ep.name for ep in manifest.iter_entry_points('tiget.plugins')]
+        eq_(names, ['core', 'date'])
+        ok_(os.path.exists(manifest.get_manifest_path()))
+        manifest._groups = None
+        list(manifest.iter_entry_points('tiget.plugins'))
+        eq_(scan.call_count, 1)
+
+    @patch('tiget.plugins.manifest._scan', return_value=ENTRY_POINTS)
+    def test_rescan_on_key_change(self, scan):
+        list(manifest.iter_entry_points('tiget.plugins'))
+        with patch('tiget.plugins.manifest.get_manifest_key') as get_key:
+            get_key.return_value = 'changed'
+            list(manifest.iter_entry_points('tiget.plugins'))
+        eq_(scan.call_count, 2)
+
+    @patch('tiget.plugins.manifest._scan', return_value=ENTRY_POINTS)
+    def test_load(self, scan):
+        from datetime import date
+        ep, = manifest.iter_entry_points('tiget.plugins', 'date')
+        eq_(ep.load(), date)
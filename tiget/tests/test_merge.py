@@ -0,0 +1,121 @@
+import sys
+from types import ModuleType
+
+from io import StringIO
+
+from nose.tools import *
+from mock import patch
+from git_orm import models, transaction
+
+from tiget.testcases import TigetTestCase
+from tiget.conf import settings
+from tiget.git import get_head
+from tiget.changes import get_branch_ref, get_remote_ref
+from tiget.plugins import load_plugin, unload_plugin
+from tiget.merge import merge
+from tiget.cmds import CmdError, get_command
+from tiget.utils import TerminalGeometry
+
+
+class Note(models.Model):
+    title = models.TextField()
+    body = models.TextField(null=True)
+
+
+class FakeTerminal(StringIO):
+    def isatty(self):
+        return True
+
+    def fileno(self):
+        return -1
+
+
+class TestMerge(TigetTestCase):
+    def setup(self):
+        super().setup()
+        mod = ModuleType('tiget_notes')
+        mod.load = lambda plugin: plugin.add_model(Note)
+        sys.modules[mod.__name__] = mod
+        load_plugin(mod.__name__)
+        self.note = Note.create(title='foo')
+
+    def teardown(self):
+        unload_plugin('tiget_notes')
+        del sys.modules['tiget_notes']
+        super().teardown()
+
+    def set_ref(self, ref, commit):
+        settings.core.repository.create_reference(ref, commit, force=True)
+
+    def diverge(self, ours, theirs):
+        base = get_head()
+        ours()
+        our_head = get_head()
+        self.set_ref(get_branch_ref(), base)
+        theirs()
+        self.set_ref(get_remote_ref(), get_head())
+        self.set_ref(get_branch_ref(), our_head)
+        return our_head
+
+    def edit(self, **kwargs):
+        def _edit():
+            with transaction.wrap('edit'):
+                note = Note.objects.get(pk=self.note.pk)
+                for name, value in kwargs.items():
+                    setattr(note, name, value)
+                note.save()
+        return _edit
+
+    def get_note(self):
+        with transaction.wrap():
+            return Note.objects.get(pk=self.note.pk)
+
+    def test_fast_forward(self):
+        base = get_head()
+        self.edit(title='bar')()
+        self.set_ref(get_remote_ref(), get_head())
+        self.set_ref(get_branch_ref(), base)
+        eq_(merge(), ('fast-forward', []))
+        eq_(self.get_note().title, 'bar')
+        eq_(merge(), ('up-to-date', []))
+
+    def test_merge_fields(self):
+        def theirs():
+            self.edit(body='baz')()
+            Note.create(title='new')
+        ours = self.diverge(self.edit(title='bar'), theirs)
+        eq_(merge(), ('merged', []))
+        note = self.get_note()
+        eq_((note.title, note.body), ('bar', 'baz'))
+        with transaction.wrap():
+            eq_(Note.objects.count(), 2)
+        commit = settings.core.repository[get_head()]
+        eq_([parent.hex for parent in commit.parents][0], ours)
+
+    def test_conflict(self):
+        ours = self.diverge(self.edit(title='bar'), self.edit(title='baz'))
+        status, conflicts = merge()
+        eq_(status, 'conflict')
+        eq_(len(conflicts), 1)
+        conflict = conflicts[0]
+        eq_(conflict.path, ('notes', self.note.path[1]))
+        eq_(conflict.field, 'title')
+        eq_((conflict.base, conflict.ours, conflict.theirs),
+            ('foo', 'bar', 'baz'))
+        eq_(get_head(), ours)
+        status, conflicts = merge(resolve='theirs')
+        eq_(status, 'merged')
+        eq_(self.get_note().title, 'baz')
+
+    @patch('tiget.utils.get_termsize', lambda fd: TerminalGeometry(24, 80))
+    def test_conflict_output(self):
+        self.diverge(self.edit(title='bar'), self.edit(title='baz'))
+        terminal = FakeTerminal()
+        with patch('sys.stdout', terminal):
+            assert_raises(CmdError, get_command('merge').run)
+        rows = [
+            [cell.strip() for cell in line.split('|')[2:-1]]
+            for line in terminal.getvalue().splitlines()
+            if line.startswith('|')
+        ]
+        ok_(['title', 'foo', 'bar', 'baz'] in rows)
@@ -0,0 +1,83 @@
+import os
+import shutil
+import struct
+from tempfile import mkdtemp
+
+from nose.tools import *
+from mock import patch
+
+from tiget.conf import settings
+from tiget.utils import Pager, PagerClosed, TerminalGeometry, get_termsize
+
+
+class FakeTerminal:
+    def __init__(self):
+        self.content = ''
+
+    def isatty(self):
+        return True
+
+    def fileno(self):
+        return -1
+
+    def write(self, s):
+        self.content += s
+
+    def flush(self):
+        pass
+
+
+@patch('tiget.utils.get_termsize', lambda fd: TerminalGeometry(5, 10))
+class TestPager:
+    def setup(self):
+        self.tmpdir = mkdtemp()
+        self.filename = os.path.join(self.tmpdir, 'paged')
+        self.old_pager = settings.core.pager
+        settings.core.pager = 'cat > {}'.format(self.filename)
+
+    def teardown(self):
+        settings.core.pager = self.old_pager
+        shutil.rmtree(self.tmpdir)
+
+    def test_short_output_is_printed(self):
+        terminal = FakeTerminal()
+        pager = Pager(terminal)
+        pager.write('a\nb\n')
+        eq_(terminal.content, '')
+        pager.close()
+        eq_(terminal.content, 'a\nb\n')
+        ok_(not os.path.exists(self.filename))
+
+    def test_long_lines_are_paginated(self):
+        pager = Pager(FakeTerminal())
+        pager.write('a\n')
+        ok_(pager.process is None)
+        pager.write('x' * 35 + '\n')
+        ok_(not pager.process is None)
+        pager.write('b\n')
+        pager.close()
+        with open(self.filename) as f:
+            eq_(f.read(), 'a\n' + 'x' * 35 + '\nb\n')
+
+    def test_broken_pipe(self):
+        r, w = os.pipe()
+        os.close(r)
+        stream = open(w, 'w', buffering=1)
+        pager = Pager(stream)
+        assert_raises(PagerClosed, pager.write, 'a\n')
+        assert_raises(PagerClosed, pager.write, 'b\n')
+        pager.abort()
+        try:
+            stream.close()
+        except IOError:
+            pass
+
+
+@patch('fcntl.ioctl', lambda fd, op, arg: struct.pack('hh', 0, 0))
+def test_unsized_terminal():
+    eq_(get_termsize(), TerminalGeometry(25, 80))
+    terminal = FakeTerminal()
+    pager = Pager(terminal)
+    pager.write('foo\n')
+    pager.close()
+    eq_(terminal.content, 'foo\n')
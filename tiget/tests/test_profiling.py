@@ -0,0 +1,37 @@
+from io import StringIO
+
+from nose.tools import *
+
+from tiget.profiling import get_profiler, profiling, profile_iter
+
+
+def test_phases():
+    eq_(get_profiler().active, False)
+    with profiling() as profiler:
+        ok_(get_profiler() is profiler)
+        with profiler.phase('outer'):
+            with profiler.phase('inner'):
+                pass
+            with profiler.phase('inner'):
+                pass
+        eq_(list(profile_iter('iter', range(3))), [0, 1, 2])
+    eq_(get_profiler().active, False)
+    eq_(sorted(profiler.phases), ['command', 'inner', 'iter', 'outer'])
+    eq_(profiler.phases['inner'][0], 2)
+    eq_(profiler.phases['iter'][0], 4)
+    # nested phases are not counted twice
+    wall = sum(wall for calls, wall, cpu in profiler.phases.values())
+    assert_almost_equal(wall, profiler.wall, places=3)
+    f = StringIO()
+    profiler.report('test', file=f)
+    ok_(f.getvalue().startswith('test: '))
+
+
+def test_nested_profiling():
+    with profiling(cprofile=True) as outer:
+        with profiling(cprofile=True) as inner:
+            ok_(get_profiler() is inner)
+        ok_(get_profiler() is outer)
+    f = StringIO()
+    inner.print_top(5, file=f)
+    ok_('function calls' in f.getvalue())
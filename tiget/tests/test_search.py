@@ -0,0 +1,56 @@
+from nose.tools import *
+from git_orm import models, transaction
+
+from tiget.testcases import TigetTestCase
+from tiget.git import get_head
+from tiget.queryset import IndexedQuerySet
+from tiget.search import get_search_index
+
+
+class Page(models.Model):
+    title = models.TextField()
+    body = models.TextField(null=True)
+
+
+Page.objects = IndexedQuerySet(Page)
+
+
+class TestSearchIndex(TigetTestCase):
+    def setup(self):
+        super().setup()
+        with transaction.wrap('setup'):
+            self.crash = Page.create(title='Crash on start', body='segfault')
+            self.slow = Page.create(title='Slow start')
+            Page.create(title='Typo', body='crash course')
+        self.index = get_search_index(Page, ('title', 'body'))
+
+    def search(self, query):
+        return [pk for score, pk in self.index.search(get_head(), query)]
+
+    def test_ranking(self):
+        eq_(len(self.search('crash')), 2)
+        eq_(self.search('crash start'), [self.crash.pk])
+        eq_(self.search('start')[:1], [self.slow.pk])
+        eq_(self.search('missing'), [])
+
+    def test_incremental_update(self):
+        self.search('crash')
+
+        def rebuild(commit):
+            raise AssertionError('index was rebuilt')
+        self.index.rebuild = rebuild
+        try:
+            self.slow.body = 'crash after a while'
+            self.slow.save()
+            eq_(len(self.search('crash')), 3)
+            self.slow.body = None
+            self.slow.save()
+            eq_(self.search('while'), [])
+        finally:
+            del self.index.rebuild
+
+    def test_persistence(self):
+        self.search('crash')
+        self.index.commit = None
+        self.index.clear()
+        eq_(self.search('segfault'), [self.crash.pk])
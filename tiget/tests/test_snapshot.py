@@ -0,0 +1,60 @@
+from nose.tools import *
+from git_orm import models, transaction, GitError
+
+from tiget.testcases import TigetTestCase
+from tiget.git import get_head
+from tiget.queryset import IndexedQuerySet
+from tiget.snapshot import ReadOnlyError, snapshot
+
+
+class Page(models.Model):
+    title = models.TextField()
+
+
+Page.objects = IndexedQuerySet(Page)
+
+
+class TestSnapshot(TigetTestCase):
+    def setup(self):
+        super().setup()
+        self.page = Page.create(title='foo')
+
+    def test_read(self):
+        with snapshot() as trans:
+            eq_(trans.commit_oid.hex, get_head())
+            eq_(Page.objects.get(pk=self.page.pk).title, 'foo')
+            eq_(Page.objects.count(), 1)
+        assert_raises(GitError, transaction.current)
+
+    def test_write(self):
+        with snapshot() as trans:
+            assert_raises(ReadOnlyError, trans.set_blob, ['foo'], b'bar')
+            assert_raises(ReadOnlyError, Page.create, title='bar')
+        eq_(list(Page.objects.all()), [self.page])
+
+    def test_running_transaction(self):
+        with transaction.wrap() as trans:
+            page = Page.create(title='bar')
+            with snapshot() as current:
+                ok_(current is trans)
+                eq_(Page.objects.get(pk=page.pk).title, 'bar')
+        eq_(Page.objects.count(), 2)
+
+    def test_shared(self):
+        with snapshot() as first:
+            pass
+        with snapshot() as second:
+            ok_(first is second)
+        Page.create(title='bar')
+        with snapshot() as third:
+            ok_(not third is first)
+            eq_(third.commit_oid.hex, get_head())
+
+    def test_decorator(self):
+        @snapshot()
+        def count(depth):
+            if depth:
+                return count(depth - 1)
+            return Page.objects.count()
+        eq_(count(2), 1)
+        assert_raises(GitError, transaction.current)
@@ -0,0 +1,88 @@
+import os
+import shutil
+import tempfile
+import subprocess
+from io import StringIO
+
+from nose.tools import *
+from mock import patch
+from git_orm import transaction
+
+from tiget.testcases import TigetTestCase
+from tiget.conf import settings
+from tiget.git import get_head
+from tiget.changes import get_remote_ref
+from tiget.sync import fetch, push, sync_remotes
+from tiget.cmds import CmdError, get_command
+from tiget.utils import TerminalGeometry
+
+
+class FakeTerminal(StringIO):
+    def isatty(self):
+        return True
+
+    def fileno(self):
+        return -1
+
+
+class TestSync(TigetTestCase):
+    def setup(self):
+        super().setup()
+        self.remote_dirs = []
+        for name in ('north', 'south'):
+            path = tempfile.mkdtemp()
+            self.remote_dirs.append(path)
+            self.git('init', '-q', '--bare', path)
+            self.git('remote', 'add', name, path)
+        self.git('remote', 'add', 'broken', '/nonexistent')
+        settings.core.remote = 'north,south'
+        with transaction.wrap() as trans:
+            trans.set_blob(['foo'], b'bar')
+            trans.add_message('foo')
+
+    def teardown(self):
+        settings.core.remote = 'origin'
+        for path in self.remote_dirs:
+            shutil.rmtree(path)
+        super().teardown()
+
+    def git(self, *args):
+        subprocess.check_call(('git', '--git-dir', self.repo.path) + args)
+
+    def test_remote_setting(self):
+        eq_(settings.core.remote, ['north', 'south'])
+        eq_(settings.core.get_display('remote'), 'north,south')
+        eq_(get_remote_ref(), 'refs/remotes/north/tiget')
+
+    def test_push_and_fetch(self):
+        remotes = ['north', 'south', 'broken']
+        results = sync_remotes(push, remotes)
+        eq_([result.remote for result in results], remotes)
+        eq_([result.error is None for result in results], [True, True, False])
+        eq_(results[2].error,
+            "fatal: '/nonexistent' does not appear to be a git repository")
+        results = sync_remotes(fetch, ['north', 'south'])
+        ok_(all(result.error is None for result in results))
+        for remote in ('north', 'south'):
+            ref = self.repo.lookup_reference(get_remote_ref(remote))
+            eq_(ref.target.hex, get_head())
+
+    def test_fetch_head_is_not_written(self):
+        sync_remotes(push, ['north'])
+        sync_remotes(fetch, ['north', 'south'])
+        ok_(not os.path.exists(os.path.join(self.repo.path, 'FETCH_HEAD')))
+
+    def test_git_not_found(self):
+        with patch.dict(os.environ, PATH=''):
+            results = sync_remotes(fetch, ['north', 'south'])
+        eq_([result.remote for result in results], ['north', 'south'])
+        ok_(all(result.error for result in results))
+
+    @patch('tiget.utils.get_termsize', lambda fd: TerminalGeometry(24, 80))
+    def test_failure_output(self):
+        terminal = FakeTerminal()
+        with patch('sys.stdout', terminal):
+            assert_raises(CmdError, get_command('push').run, '--all', 'broken')
+        output = terminal.getvalue()
+        ok_('| north ' in output)
+        ok_('| broken ' in output)
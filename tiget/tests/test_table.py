@@ -0,0 +1,36 @@
+from nose.tools import *
+from mock import patch
+
+from tiget.table import Table
+from tiget.utils import TerminalGeometry
+
+
+@patch('tiget.table.get_termsize', lambda: TerminalGeometry(25, 80))
+class TestTable:
+    def test_render(self):
+        table = Table('a', 'bb')
+        table.add_row('x', None)
+        eq_(table.render(), (
+            '+---+----+\n'
+            '| a | bb |\n'
+            '+---+----+\n'
+            '| x |    |\n'
+            '+---+----+\n'))
+
+    def test_lazy_rows_are_consumed_while_rendering(self):
+        consumed = []
+
+        def _rows():
+            for value in ('a', 'b', 'c', 'dd'):
+                consumed.append(value)
+                yield [value]
+
+        table = Table('n')
+        table.SAMPLE_SIZE = 3
+        table.add_rows(_rows())
+        lines = table.render_lines()
+        eq_(next(lines), '+---+\n')
+        eq_(consumed, ['a', 'b', 'c'])
+        # rows after the sample are wrapped to the sampled width
+        eq_(list(lines)[-3:], ['| d |\n', '| d |\n', '+---+\n'])
+        eq_(consumed, ['a', 'b', 'c', 'dd'])
@@ -1,22 +1,22 @@
 import os
 import sys
+import math
+import errno
 import fcntl
 import termios
 import struct
 import traceback
 from io import StringIO
+from subprocess import Popen, PIPE
 from importlib import import_module
 from collections import namedtuple
 from tempfile import NamedTemporaryFile
 
-from colors import red
-from git_orm import transaction, GitError
-
 from tiget.conf import settings
 
 __all__ = [
-    'open_in_editor', 'paginate', 'get_termsize', 'print_error', 'post_mortem',
-    'load_file',
+    'open_in_editor', 'PagerClosed', 'Pager', 'paginate', 'get_termsize',
+    'print_error', 'post_mortem', 'load_file',
 ]
 
 
@@ -29,19 +29,112 @@ def open_in_editor(content):
     return content
 
 
+class PagerClosed(Exception): pass
+
+
+class Pager:
+    # Output is buffered until it doesn't fit on the screen anymore, then
+    # the pager is started and everything is piped into it. When stdout is
+    # no terminal, output is written through immediately.
+    def __init__(self, stream=None):
+        self.stream = stream or sys.stdout
+        self.interactive = self.stream.isatty()
+        self.buffer = []
+        self.rows = 0
+        self.column = 0
+        self.process = None
+        self.closed = False
+        self.geometry = None
+
+    def _count_rows(self, s):
+        cols = self.geometry.cols
+        *lines, last = s.split('\n')
+        for line in lines:
+            width = self.column + len(line)
+            self.rows += max(1, math.ceil(width / cols))
+            self.column = 0
+        self.column += len(last)
+        return self.rows + math.ceil(self.column / cols)
+
+    def _write(self, stream, s):
+        try:
+            stream.write(s)
+        except IOError as e:
+            if not e.errno == errno.EPIPE:
+                raise
+            self._broken_pipe(stream)
+
+    def _flush(self, stream):
+        try:
+            stream.flush()
+        except IOError as e:
+            if not e.errno == errno.EPIPE:
+                raise
+            self._broken_pipe(stream)
+
+    def _broken_pipe(self, stream):
+        self.closed = True
+        if stream is sys.__stdout__:
+            # prevent another broken pipe error when python exits
+            devnull = os.open(os.devnull, os.O_WRONLY)
+            os.dup2(devnull, stream.fileno())
+            os.close(devnull)
+        raise PagerClosed()
+
+    def _start(self):
+        self.process = Popen(
+            settings.core.pager, shell=True, stdin=PIPE,
+            universal_newlines=True)
+        buffered, self.buffer = ''.join(self.buffer), []
+        self._write(self.process.stdin, buffered)
+
+    def write(self, s):
+        if self.closed:
+            raise PagerClosed()
+        if not self.interactive:
+            self._write(self.stream, s)
+        elif self.process:
+            self._write(self.process.stdin, s)
+        else:
+            self.buffer.append(s)
+            if self.geometry is None:
+                self.geometry = get_termsize(self.stream.fileno())
+            if self._count_rows(s) > self.geometry.lines - 1:
+                self._start()
+
+    def _stop(self):
+        try:
+            self.process.stdin.close()
+        except IOError:
+            pass
+        self.process.wait()
+        self.process = None
+
+    def close(self):
+        if self.closed:
+            return
+        if self.process:
+            self._stop()
+        elif self.buffer:
+            self._write(self.stream, ''.join(self.buffer))
+            self.buffer = []
+        self._flush(self.stream)
+        self.closed = True
+
+    def abort(self):
+        if self.process:
+            self._stop()
+        self.buffer = []
+        self.closed = True
+
+
 def paginate(content):
-    geometry = get_termsize()
-    needs_pagination = False
-    # TODO: better performance; consider long lines
-    if len(content.splitlines()) > geometry.lines - 1:
-        needs_pagination = True
-    if needs_pagination:
-        with NamedTemporaryFile(prefix='tiget') as f:
-            f.write(content.encode('utf-8'))
-            f.seek(0)
-            os.system('{} {}'.format(settings.core.pager, f.name))
-    else:
-        print(content, end='')
+    pager = Pager()
+    try:
+        pager.write(content)
+        pager.close()
+    except PagerClosed:
+        pass
 
 
 TerminalGeometry = namedtuple('TerminalGeometry', ('lines', 'cols'))
@@ -52,12 +145,15 @@ def get_termsize(fd=1):
         geometry = struct.unpack(
             'hh', fcntl.ioctl(fd, termios.TIOCGWINSZ, '1234'))
     except IOError:
-        geometry = (25, 80)
+        geometry = (0, 0)
+    if not all(geometry):
+        geometry = (25, 80)     # e.g. a pty without a window size
     return TerminalGeometry(*geometry)
 
 
 def print_error(line):
     if settings.core.color:
+        from colors import red
         line = red(str(line))
     print(line, file=sys.stderr)
 
@@ -78,9 +174,11 @@ def post_mortem():
 
 
 def load_file(filename):
+    from git_orm import GitError
+    from tiget.snapshot import snapshot
     if filename.startswith('tiget:'):
         try:
-            with transaction.wrap() as trans:
+            with snapshot() as trans:
                 path = filename[len('tiget:'):].strip('/').split('/')
                 content = trans.get_blob(path).decode('utf-8')
         except GitError: